@@ -0,0 +1,108 @@
+"""
+Dispatch cost per command: legacy tokenize + if-chain vs CommandDispatcher.
+
+    python benchmarks/command_dispatch.py [iterations]
+
+Handlers are no-ops, so the numbers are pure routing overhead.
+"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dispatch import CommandDispatcher  # noqa: E402
+
+COMMANDS = ["love", "propose", "crush", "prank", "breakup", "loveboard", "help", "vibe"]
+USERNAME = "lovegamebot"
+
+
+async def noop(message):
+    pass
+
+
+def make_message(text: str) -> SimpleNamespace:
+    # What pyrogram's command filter leaves on the message
+    parts = text.split()
+    return SimpleNamespace(text=text, command=[parts[0][1:].split("@")[0].lower()] + parts[1:])
+
+
+async def legacy_route(message) -> bool:
+    # Layout of command_router before the registry existed
+    token = message.text.split(maxsplit=1)[0].strip()
+    if not token.startswith("/"):
+        return False
+
+    command, _, mention = token[1:].partition("@")
+    command = command.lower()
+    if command not in COMMANDS:
+        return False
+    if mention and mention.lower() != USERNAME:
+        return False
+
+    if command == "love":
+        await noop(message)
+    elif command == "propose":
+        await noop(message)
+    elif command == "crush":
+        await noop(message)
+    elif command == "prank":
+        await noop(message)
+    elif command == "breakup":
+        await noop(message)
+    elif command == "loveboard":
+        await noop(message)
+    elif command == "help":
+        await noop(message)
+    elif command == "vibe":
+        await noop(message)
+    return True
+
+
+def registry() -> CommandDispatcher:
+    dispatcher = CommandDispatcher(app=None)
+    dispatcher.username = USERNAME
+    for name in COMMANDS:
+        dispatcher.register(name, noop)
+    return dispatcher
+
+
+async def registry_route(dispatcher: CommandDispatcher, message) -> bool:
+    resolved = await dispatcher.resolve(message)
+    if not resolved:
+        return False
+    await resolved[1](message)
+    return True
+
+
+async def measure(route, messages, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in messages:
+            await route(message)
+    return (time.perf_counter() - start) / (iterations * len(messages))
+
+
+async def run(iterations: int):
+    messages = [make_message(f"/{name} some args") for name in COMMANDS]
+    messages += [make_message(f"/{name}@{USERNAME}") for name in COMMANDS]
+
+    dispatcher = registry()
+    legacy = await measure(legacy_route, messages, iterations)
+    current = await measure(lambda message: registry_route(dispatcher, message), messages, iterations)
+
+    print(f"{iterations * len(messages)} commands")
+    print(f"  if-chain: {legacy * 1e9:7.0f} ns/command")
+    print(f"  registry: {current * 1e9:7.0f} ns/command")
+    print(f"  speedup:  {legacy / current:.2f}x")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    asyncio.run(run(iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Memory benchmark: legacy dict sessions vs slotted Session objects.
+
+    python benchmarks/session_memory.py [count]
+"""
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_manager import Session  # noqa: E402
+
+MODES = ("proposal", "crush", "prank", "breakup")
+
+
+def legacy_session(index: int, now: float) -> dict:
+    # Layout used before Session existed
+    return {
+        "session_id": str(uuid.uuid4())[:8],
+        "group_id": -1000000000000 - index % 500,
+        "mode": MODES[index % 4],
+        "proposer_id": 100000000 + index,
+        "target_id": 200000000 + index,
+        "rejection_count": 0,
+        "stage": "init",
+        "created_at": now,
+        "status": "active",
+        "message_id": None,
+    }
+
+
+def slotted_session(index: int, now: float) -> Session:
+    return Session(index, -1000000000000 - index % 500, MODES[index % 4], 100000000 + index, 200000000 + index, now)
+
+
+def measure(factory, count: int) -> int:
+    now = time.time()
+    tracemalloc.start()
+    sessions = [factory(index, now) for index in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sessions
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    legacy = measure(legacy_session, count)
+    slotted = measure(slotted_session, count)
+    print(f"{count} sessions")
+    print(f"  dict:    {legacy / count:7.1f} bytes/session ({legacy / 1024 / 1024:.1f} MiB)")
+    print(f"  Session: {slotted / count:7.1f} bytes/session ({slotted / 1024 / 1024:.1f} MiB)")
+    print(f"  saving:  {(1 - slotted / legacy) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
 import logging
 from pyrogram import Client
 from pyrogram.types import Message, CallbackQuery
+from dispatch import CallbackData, CallbackDispatcher
 from session_manager import SessionManager
-from storage import JSONStorage
+from couple_registry import CoupleRegistry
+from effects import EffectScheduler
+from outbound import Outbound
+from user_cache import UserCache
 from keyboards import breakup_confirm
 from utils import (
     mention,
-    parse_callback,
     breakup_archived,
-    cinematic_delay,
     not_yours_message,
     expired_message
 )
@@ -21,11 +23,18 @@ class BreakupEngine:
     def __init__(
         self,
         app: Client,
-        session_manager: SessionManager
+        session_manager: SessionManager,
+        couples: CoupleRegistry,
+        users: UserCache,
+        effects: EffectScheduler,
+        outbound: Outbound
     ):
         self.app = app
         self.sessions = session_manager
-        self.couples_storage = JSONStorage("couples.json")
+        self.couples = couples
+        self.users = users
+        self.effects = effects
+        self.outbound = outbound
 
     # --------------------------------------------------
     # START BREAKUP
@@ -36,12 +45,10 @@ class BreakupEngine:
         group_id = message.chat.id
         user = message.from_user
 
-        couples = await self.couples_storage.get(str(group_id), {})
-
-        partner_id = couples.get(str(user.id))
+        partner_id = self.couples.partner_of(group_id, user.id)
 
         if not partner_id:
-            await message.reply("💔 Tum currently kisi registered love story me nahi ho.")
+            await self.outbound.reply(message, "💔 Tum currently kisi registered love story me nahi ho.")
             return
 
         try:
@@ -52,29 +59,36 @@ class BreakupEngine:
                 target_id=partner_id
             )
         except Exception as e:
-            await message.reply(str(e))
+            await self.outbound.reply(message, str(e))
             return
 
-        partner = await self.app.get_users(partner_id)
+        self.users.seed(user)
+        partner = await self.users.get(partner_id)
 
-        await message.reply(
+        sent = await self.outbound.reply(
+            message,
             f"{mention(user.id, user.first_name)} wants to end the love story with "
             f"{mention(partner.id, partner.first_name)}…\n\n"
             "Kya yahi the end hai, ya last chance bacha hai?",
-            reply_markup=breakup_confirm(session["session_id"]),
+            reply_markup=breakup_confirm(session.session_id),
             disable_web_page_preview=True
         )
+        await self.sessions.attach_message(group_id, session.session_id, sent.id)
 
     # --------------------------------------------------
     # HANDLE CALLBACK
     # --------------------------------------------------
 
-    async def handle_callback(self, callback: CallbackQuery):
+    def register(self, dispatcher: CallbackDispatcher):
+        for action in ("confirm", "cancel"):
+            dispatcher.register("love", "breakup", action, self.handle_callback)
+
+    async def handle_callback(self, callback: CallbackQuery, data: CallbackData):
 
-        prefix, mode, session_id, action = parse_callback(callback.data)
+        session_id, action = data.session_id, data.action
         group_id = callback.message.chat.id
 
-        session = self.sessions.get_session(group_id, session_id)
+        session = await self.sessions.get_session(group_id, session_id)
 
         if not session:
             await callback.answer(expired_message(), show_alert=True)
@@ -100,23 +114,14 @@ class BreakupEngine:
 
             await callback.answer("Processing heartbreak... 💔")
 
-            await cinematic_delay(2)
-
-            couples = await self.couples_storage.get(str(group_id), {})
-
-            # Remove both directions
-            proposer_id = session["proposer_id"]
-            target_id = session["target_id"]
-
-            couples.pop(str(proposer_id), None)
-            couples.pop(str(target_id), None)
-
-            await self.couples_storage.set(str(group_id), couples)
-
-            await callback.message.edit_text(breakup_archived())
+            # Removes both directions
+            await self.couples.unpair(group_id, session.proposer_id)
 
             await self.sessions.end_session(group_id, session_id)
 
+            # The session is over; only the reveal waits out the dramatic pause
+            self.effects.schedule(2, lambda: self.outbound.edit(callback.message, breakup_archived()))
+
         # --------------------------------------------------
         # CANCEL
         # --------------------------------------------------
@@ -124,7 +129,7 @@ class BreakupEngine:
         elif action == "cancel":
 
             await callback.answer("Breakup cancelled. Pyaar wins 🥺")
-            await callback.message.edit_text("💞 Love story continues. Audience emotional ho gayi.")
+            await self.outbound.edit(callback.message, "💞 Love story continues. Audience emotional ho gayi.")
             await self.sessions.end_session(group_id, session_id)
         else:
             await callback.answer("Yeh option valid nahi hai.", show_alert=True)
@@ -1,5 +1,6 @@
 import os
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass
@@ -7,11 +8,53 @@ class Config:
     API_ID: int
     API_HASH: str
     BOT_TOKEN: str
+    STORAGE_BACKEND: str = "json"
+    STORAGE_FLUSH_INTERVAL: float = 0
+    STORAGE_FLUSH_EVERY: int = 100
+    SQLITE_PATH: str = "valentine.db"
+    METRICS_INTERVAL: float = 300
+    SESSION_STATE_PATH: str = ""
+    SESSION_STORE_URL: str = ""
+    SHARD_COUNT: int = 1
+    SHARD_INDEX: Optional[int] = None
 
     @classmethod
     def load(cls):
-        return cls(
+        shard_index = os.getenv("SHARD_INDEX")
+        config = cls(
             API_ID=int(os.getenv("API_ID")),
             API_HASH=os.getenv("API_HASH"),
             BOT_TOKEN=os.getenv("BOT_TOKEN"),
+            STORAGE_BACKEND=os.getenv("STORAGE_BACKEND", "json").lower(),
+            STORAGE_FLUSH_INTERVAL=float(os.getenv("STORAGE_FLUSH_INTERVAL", "0")),
+            STORAGE_FLUSH_EVERY=int(os.getenv("STORAGE_FLUSH_EVERY", "100")),
+            SQLITE_PATH=os.getenv("SQLITE_PATH", "valentine.db"),
+            METRICS_INTERVAL=float(os.getenv("METRICS_INTERVAL", "300")),
+            SESSION_STATE_PATH=os.getenv("SESSION_STATE_PATH", ""),
+            SESSION_STORE_URL=os.getenv("SESSION_STORE_URL", ""),
+            SHARD_COUNT=int(os.getenv("SHARD_COUNT", "1")),
+            SHARD_INDEX=int(shard_index) if shard_index else None,
         )
+
+        # Shards only share state through the database
+        if config.SHARD_COUNT > 1 and config.STORAGE_BACKEND != "sqlite":
+            raise ValueError("SHARD_COUNT > 1 requires STORAGE_BACKEND=sqlite")
+
+        return config
+
+    @property
+    def sharded(self) -> bool:
+        return self.SHARD_COUNT > 1
+
+    def session_state_path(self) -> str:
+        if self.SESSION_STATE_PATH and self.SHARD_INDEX is not None:
+            return f"{self.SESSION_STATE_PATH}.{self.SHARD_INDEX}"
+        return self.SESSION_STATE_PATH
+
+    def storage_options(self) -> dict:
+        return {
+            "backend": self.STORAGE_BACKEND,
+            "flush_interval": self.STORAGE_FLUSH_INTERVAL,
+            "flush_every": self.STORAGE_FLUSH_EVERY,
+            "sqlite_path": self.SQLITE_PATH,
+        }
@@ -0,0 +1,91 @@
+import logging
+from typing import Dict, List, Optional
+from storage import create_storage
+
+logger = logging.getLogger(__name__)
+
+
+class CoupleRegistry:
+    """
+    Single owner of the couples store.
+
+    Created once and shared by every engine, so there is exactly one
+    in-memory copy and one writer. Partners are indexed in both
+    directions, so either member of a couple resolves in O(1), and
+    each change writes only the affected rows, as one storage mutation.
+    """
+
+    def __init__(self, storage_options: Optional[dict] = None):
+        self.storage = create_storage("couples.json", **(storage_options or {}))
+        self._partners: Dict[int, Dict[int, int]] = {}
+
+    # --------------------------------------------------
+    # couples.json format (both directions stored):
+    #
+    # {
+    #   "group_id": {
+    #       "user_id": partner_id
+    #   }
+    # }
+    # --------------------------------------------------
+
+    async def load(self):
+        """Build the partner index. Older files only hold proposer -> target."""
+        data = await self.storage.all()
+        for group_id, pairs in data.items():
+            index = self._partners.setdefault(int(group_id), {})
+            for user_id, partner_id in pairs.items():
+                self._link(index, int(user_id), int(partner_id))
+        logger.info(f"Loaded couples for {len(self._partners)} groups")
+
+    # --------------------------------------------------
+    # LOOKUPS
+    # --------------------------------------------------
+
+    def partner_of(self, group_id: int, user_id: int) -> Optional[int]:
+        return self._partners.get(group_id, {}).get(user_id)
+
+    # --------------------------------------------------
+    # UPDATES
+    # --------------------------------------------------
+
+    async def pair(self, group_id: int, user_a: int, user_b: int):
+        """Register a couple, ending any previous story of either partner."""
+        index = self._partners.setdefault(group_id, {})
+        orphans = self._link(index, user_a, user_b)
+        await self.storage.update_nested_many(
+            str(group_id),
+            {str(user_a): user_b, str(user_b): user_a},
+            deleted=[str(orphan) for orphan in orphans]
+        )
+
+    async def unpair(self, group_id: int, user_id: int) -> Optional[int]:
+        """Remove the couple `user_id` belongs to. Returns the former partner."""
+        index = self._partners.get(group_id, {})
+        partner_id = index.pop(user_id, None)
+        if partner_id is None:
+            return None
+        index.pop(partner_id, None)
+        if not index:
+            self._partners.pop(group_id, None)
+
+        await self.storage.update_nested_many(str(group_id), {}, deleted=[str(user_id), str(partner_id)])
+        return partner_id
+
+    # --------------------------------------------------
+    # INTERNAL
+    # --------------------------------------------------
+
+    @staticmethod
+    def _link(index: Dict[int, int], user_a: int, user_b: int) -> List[int]:
+        """Link a <-> b; returns former partners left single by it."""
+        orphans = []
+        for user_id in (user_a, user_b):
+            previous = index.pop(user_id, None)
+            if previous is not None:
+                index.pop(previous, None)
+                if previous not in (user_a, user_b):
+                    orphans.append(previous)
+        index[user_a] = user_b
+        index[user_b] = user_a
+        return orphans
@@ -1,12 +1,14 @@
 import logging
 from pyrogram import Client
 from pyrogram.types import Message, CallbackQuery
+from dispatch import CallbackData, CallbackDispatcher
 from session_manager import SessionManager
 from leaderboard import Leaderboard
 from keyboards import crush_target, crush_reveal_decision
+from outbound import Outbound
+from user_cache import UserCache
 from utils import (
     mention,
-    parse_callback,
     crush_message,
     crush_secret_kept,
     not_yours_message,
@@ -22,11 +24,15 @@ class CrushEngine:
         self,
         app: Client,
         session_manager: SessionManager,
-        leaderboard: Leaderboard
+        leaderboard: Leaderboard,
+        users: UserCache,
+        outbound: Outbound
     ):
         self.app = app
         self.sessions = session_manager
         self.leaderboard = leaderboard
+        self.users = users
+        self.outbound = outbound
 
     # --------------------------------------------------
     # START CRUSH
@@ -35,7 +41,7 @@ class CrushEngine:
     async def start(self, message: Message):
 
         if not message.reply_to_message:
-            await message.reply("Reply to your crush aur phir /crush se secret drop karo 😏")
+            await self.outbound.reply(message, "Reply to your crush aur phir /crush se secret drop karo 😏")
             return
 
         group_id = message.chat.id
@@ -50,26 +56,35 @@ class CrushEngine:
                 target_id=target.id
             )
         except Exception as e:
-            await message.reply(str(e))
+            await self.outbound.reply(message, str(e))
             return
 
-        await self.leaderboard.add_crush(group_id, proposer.id)
+        self.users.seed(proposer)
+        self.users.seed(target)
 
-        await message.reply(
+        await self.leaderboard.record(group_id, proposer.id, crushes=1)
+
+        sent = await self.outbound.reply(
+            message,
             crush_message(),
-            reply_markup=crush_target(session["session_id"])
+            reply_markup=crush_target(session.session_id)
         )
+        await self.sessions.attach_message(group_id, session.session_id, sent.id)
 
     # --------------------------------------------------
     # HANDLE CALLBACK
     # --------------------------------------------------
 
-    async def handle_callback(self, callback: CallbackQuery):
+    def register(self, dispatcher: CallbackDispatcher):
+        for action in ("reveal", "ignore", "yes_reveal", "no_reveal"):
+            dispatcher.register("love", "crush", action, self.handle_callback)
+
+    async def handle_callback(self, callback: CallbackQuery, data: CallbackData):
 
-        prefix, mode, session_id, action = parse_callback(callback.data)
+        session_id, action = data.session_id, data.action
         group_id = callback.message.chat.id
 
-        session = self.sessions.get_session(group_id, session_id)
+        session = await self.sessions.get_session(group_id, session_id)
 
         if not session:
             await callback.answer(expired_message(), show_alert=True)
@@ -91,11 +106,12 @@ class CrushEngine:
         # TARGET PRESSES REVEAL
         # --------------------------------------------------
 
-        if action == "reveal" and user_id == session["target_id"]:
+        if action == "reveal" and user_id == session.target_id:
 
             await callback.answer()
 
-            await callback.message.edit_text(
+            await self.outbound.edit(
+                callback.message,
                 "The admirer must decide...\n\nIdentity reveal kare ya suspense chalne de?",
                 reply_markup=crush_reveal_decision(session_id)
             )
@@ -104,22 +120,23 @@ class CrushEngine:
         # TARGET IGNORES
         # --------------------------------------------------
 
-        elif action == "ignore" and user_id == session["target_id"]:
+        elif action == "ignore" and user_id == session.target_id:
 
             await callback.answer("Ignored. Mystery survived 🙈")
-            await callback.message.delete()
+            await self.outbound.delete(callback.message)
             await self.sessions.end_session(group_id, session_id)
 
         # --------------------------------------------------
         # PROPOSER CHOOSES TO REVEAL
         # --------------------------------------------------
 
-        elif action == "yes_reveal" and user_id == session["proposer_id"]:
+        elif action == "yes_reveal" and user_id == session.proposer_id:
 
-            proposer = await self.app.get_users(session["proposer_id"])
-            target = await self.app.get_users(session["target_id"])
+            proposer = await self.users.get(session.proposer_id)
+            target = await self.users.get(session.target_id)
 
-            await callback.message.edit_text(
+            await self.outbound.edit(
+                callback.message,
                 f"💌 Mystery solved.\n\n"
                 f"It was {mention(proposer.id, proposer.first_name)} "
                 f"who had a crush on "
@@ -134,9 +151,9 @@ class CrushEngine:
         # PROPOSER KEEPS SECRET
         # --------------------------------------------------
 
-        elif action == "no_reveal" and user_id == session["proposer_id"]:
+        elif action == "no_reveal" and user_id == session.proposer_id:
 
-            await callback.message.edit_text(crush_secret_kept())
+            await self.outbound.edit(callback.message, crush_secret_kept())
             await self.sessions.end_session(group_id, session_id)
             await callback.answer("Secret locked. Vibe maintained 🔒")
         else:
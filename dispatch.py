@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from pyrogram import Client
+from pyrogram.types import CallbackQuery, Message
+
+import metrics
+from utils import already_processing_message
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------------
+# CALLBACK DATA
+# menu|action
+# love|mode|session_id|action
+# --------------------------------------------------
+
+class CallbackData(NamedTuple):
+    prefix: str
+    mode: str
+    session_id: str
+    action: str
+
+
+def parse_callback_data(data: Optional[str]) -> Optional[CallbackData]:
+    """Split a button payload once; None for anything malformed."""
+    if not data:
+        return None
+
+    parts = data.split("|")
+    if len(parts) == 2:
+        return CallbackData(parts[0], "", "", parts[1])
+    if len(parts) == 4 and parts[2].isdigit():
+        return CallbackData(*parts)
+    return None
+
+
+CallbackHandler = Callable[[CallbackQuery, CallbackData], Awaitable[None]]
+
+
+# --------------------------------------------------
+# CALLBACK DISPATCHER
+# --------------------------------------------------
+
+class CallbackDispatcher:
+    """
+    Routes button presses to handlers registered per (prefix, mode, action).
+
+    Menu buttons have no mode and register with mode "".
+    Only one press per session is handled at a time; a second press
+    while the first is still running is answered straight away.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[Tuple[str, str, str], CallbackHandler] = {}
+        # (chat_id, session_id) of presses being handled right now
+        self._in_flight: Set[Tuple[int, str]] = set()
+        self.unhandled = 0
+        self.duplicates = 0
+        metrics.register("callbacks", self.stats)
+
+    def register(self, prefix: str, mode: str, action: str, handler: CallbackHandler):
+        key = (prefix, mode, action)
+        if key in self._handlers:
+            raise ValueError(f"Callback {'|'.join(key)} is already registered")
+        self._handlers[key] = handler
+
+    async def dispatch(self, callback: CallbackQuery) -> bool:
+        """Run the handler for the payload; False if none matches."""
+        data = parse_callback_data(callback.data)
+        handler = self._handlers.get((data.prefix, data.mode, data.action)) if data else None
+
+        if handler is None:
+            self.unhandled += 1
+            logger.debug(f"No callback handler for {callback.data!r}")
+            return False
+
+        if not data.session_id:
+            await handler(callback, data)
+            return True
+
+        key = (callback.message.chat.id, data.session_id)
+        if key in self._in_flight:
+            self.duplicates += 1
+            await callback.answer(already_processing_message())
+            return True
+
+        self._in_flight.add(key)
+        try:
+            await handler(callback, data)
+        finally:
+            self._in_flight.discard(key)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "handlers": len(self._handlers),
+            "in_flight": len(self._in_flight),
+            "unhandled": self.unhandled,
+            "duplicates": self.duplicates,
+        }
+
+
+CommandHandler = Callable[[Message], Awaitable[None]]
+
+
+# --------------------------------------------------
+# COMMAND DISPATCHER
+# --------------------------------------------------
+
+class CommandDispatcher:
+    """
+    Maps command names to handlers.
+
+    Pyrogram's command filter has already matched and split the command,
+    so resolving one is a dict lookup plus, for /cmd@name, a comparison
+    with the bot username fetched once at startup.
+    """
+
+    def __init__(self, app: Client):
+        self.app = app
+        self._handlers: Dict[str, CommandHandler] = {}
+        self.username: Optional[str] = None
+        self._username_refresh: Optional[asyncio.Future] = None
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._handlers)
+
+    def register(self, name: str, handler: CommandHandler):
+        if name in self._handlers:
+            raise ValueError(f"Command /{name} is already registered")
+        self._handlers[name] = handler
+
+    async def refresh_username(self) -> str:
+        """Fetch the bot username; concurrent callers share one get_me()."""
+        if self._username_refresh is None:
+            self._username_refresh = asyncio.ensure_future(self._fetch_username())
+        refresh = self._username_refresh
+        try:
+            return await asyncio.shield(refresh)
+        finally:
+            if refresh.done() and self._username_refresh is refresh:
+                self._username_refresh = None
+
+    async def _fetch_username(self) -> str:
+        me = await self.app.get_me()
+        self.username = (me.username or "").lower()
+        return self.username
+
+    async def resolve(self, message: Message) -> Optional[Tuple[str, CommandHandler]]:
+        """(name, handler) for the message's command, or None if it isn't ours."""
+        if not message.command or not message.text:
+            return None
+
+        name = message.command[0].lower()
+        handler = self._handlers.get(name)
+        if handler is None:
+            return None
+
+        mention = message.text.split(maxsplit=1)[0].partition("@")[2]
+        if mention:
+            username = self.username if self.username is not None else await self.refresh_username()
+            if mention.lower() != username:
+                return None
+
+        return name, handler
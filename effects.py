@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING_EFFECTS = 1000
+
+Effect = Callable[[], Awaitable[Any]]
+
+
+class EffectScheduler:
+    """
+    Delayed follow-ups (cinematic pauses) that don't hold a handler worker.
+
+    The handler answers right away and schedules the follow-up edit on
+    an event-loop timer. Effects tied to a session are cancelled when
+    the session ends, so a late edit can't overwrite the story's outcome.
+    Past max_pending, new effects are dropped rather than queued.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING_EFFECTS):
+        self.max_pending = max_pending
+        self._timers: Dict[int, Tuple[Optional[Tuple[int, int]], asyncio.TimerHandle]] = {}
+        self._by_session: Dict[Tuple[int, int], Set[int]] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._next_id = 0
+        self.scheduled = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.failed = 0
+        metrics.register("effects", self.stats)
+
+    def schedule(self, delay: float, effect: Effect, group_id: Optional[int] = None, session_id=None) -> bool:
+        """Run `effect()` after `delay` seconds; False if the queue is full."""
+        if len(self._timers) + len(self._running) >= self.max_pending:
+            self.dropped += 1
+            logger.warning(f"Effect queue full ({self.max_pending}), dropping effect")
+            return False
+
+        session = (group_id, int(session_id)) if session_id is not None else None
+        effect_id = self._next_id
+        self._next_id += 1
+
+        handle = asyncio.get_running_loop().call_later(delay, self._fire, effect_id, effect)
+        self._timers[effect_id] = (session, handle)
+        if session is not None:
+            self._by_session.setdefault(session, set()).add(effect_id)
+
+        self.scheduled += 1
+        return True
+
+    def cancel(self, group_id: int, session_id) -> int:
+        """Drop the session's effects that haven't fired yet."""
+        effect_ids = self._by_session.pop((group_id, int(session_id)), ())
+        for effect_id in effect_ids:
+            _, handle = self._timers.pop(effect_id)
+            handle.cancel()
+        self.cancelled += len(effect_ids)
+        return len(effect_ids)
+
+    def _fire(self, effect_id: int, effect: Effect):
+        session, _ = self._timers.pop(effect_id)
+        if session is not None:
+            effect_ids = self._by_session[session]
+            effect_ids.discard(effect_id)
+            if not effect_ids:
+                del self._by_session[session]
+
+        task = asyncio.ensure_future(self._run(effect))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, effect: Effect):
+        try:
+            await effect()
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Scheduled effect failed: {e}")
+
+    async def shutdown(self):
+        """Cancel pending timers and wait for effects already running."""
+        for _, handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        self._by_session.clear()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._timers),
+            "running": len(self._running),
+            "scheduled": self.scheduled,
+            "dropped": self.dropped,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+        }
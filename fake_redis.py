@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FakeRedisServer:
+    """
+    Tiny in-process Redis (RESP2) server, so RedisSessionStore can be
+    exercised without an outside service.
+
+    Supports what the store uses: PING, GET, SET (EX/PX/NX/XX/KEEPTTL),
+    DEL, EXISTS, PTTL, FLUSHALL and WATCH/UNWATCH/MULTI/EXEC/DISCARD.
+    Keys expire lazily when touched.
+
+        server = FakeRedisServer()
+        await server.start()
+        store = RedisSessionStore(server.url)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._data: Dict[bytes, bytes] = {}
+        self._expires: Dict[bytes, float] = {}
+        # Bumped on every write, so WATCH can detect changes
+        self._versions: Dict[bytes, int] = {}
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # --------------------------------------------------
+    # KEYSPACE
+    # --------------------------------------------------
+
+    def _touch(self, key: bytes):
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _expire_if_due(self, key: bytes):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._delete(key)
+
+    def _delete(self, key: bytes) -> bool:
+        self._expires.pop(key, None)
+        if self._data.pop(key, None) is None:
+            return False
+        self._touch(key)
+        return True
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        self._expire_if_due(key)
+        return self._data.get(key)
+
+    def _version(self, key: bytes) -> int:
+        self._expire_if_due(key)
+        return self._versions.get(key, 0)
+
+    # --------------------------------------------------
+    # PROTOCOL
+    # --------------------------------------------------
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        watched: Dict[bytes, int] = {}
+        queued: Optional[List[List[bytes]]] = None
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                name = args[0].upper()
+
+                if name == b"MULTI":
+                    queued = []
+                    reply = b"+OK\r\n"
+                elif name == b"DISCARD":
+                    queued = None
+                    watched.clear()
+                    reply = b"+OK\r\n"
+                elif name == b"EXEC":
+                    if queued is None:
+                        reply = b"-ERR EXEC without MULTI\r\n"
+                    elif any(self._version(key) != version for key, version in watched.items()):
+                        reply = b"*-1\r\n"
+                    else:
+                        replies = [self._execute(command) for command in queued]
+                        reply = b"*%d\r\n" % len(replies) + b"".join(replies)
+                    queued = None
+                    watched.clear()
+                elif name == b"WATCH":
+                    for key in args[1:]:
+                        watched[key] = self._version(key)
+                    reply = b"+OK\r\n"
+                elif name == b"UNWATCH":
+                    watched.clear()
+                    reply = b"+OK\r\n"
+                elif queued is not None:
+                    queued.append(args)
+                    reply = b"+QUEUED\r\n"
+                else:
+                    reply = self._execute(args)
+
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _execute(self, args: List[bytes]) -> bytes:
+        name = args[0].upper()
+        try:
+            if name == b"PING":
+                return b"+PONG\r\n"
+            if name == b"GET":
+                return _bulk(self._get(args[1]))
+            if name == b"SET":
+                return self._set(args[1], args[2], [arg.upper() for arg in args[3:]], args[3:])
+            if name == b"DEL":
+                return b":%d\r\n" % sum(self._delete(key) for key in args[1:] if self._get(key) is not None)
+            if name == b"EXISTS":
+                return b":%d\r\n" % sum(1 for key in args[1:] if self._get(key) is not None)
+            if name == b"PTTL":
+                if self._get(args[1]) is None:
+                    return b":-2\r\n"
+                deadline = self._expires.get(args[1])
+                return b":-1\r\n" if deadline is None else b":%d\r\n" % int((deadline - time.monotonic()) * 1000)
+            if name == b"FLUSHALL":
+                for key in list(self._data):
+                    self._delete(key)
+                return b"+OK\r\n"
+        except (IndexError, ValueError):
+            return b"-ERR syntax error\r\n"
+        return b"-ERR unknown command '%s'\r\n" % args[0]
+
+    def _set(self, key: bytes, value: bytes, flags: List[bytes], raw: List[bytes]) -> bytes:
+        exists = self._get(key) is not None
+        if b"NX" in flags and exists or b"XX" in flags and not exists:
+            return b"$-1\r\n"
+
+        deadline = self._expires.get(key) if b"KEEPTTL" in flags else None
+        for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+            if unit in flags:
+                deadline = time.monotonic() + int(raw[flags.index(unit) + 1]) * scale
+
+        self._data[key] = value
+        self._expires.pop(key, None)
+        if deadline is not None:
+            self._expires[key] = deadline
+        self._touch(key)
+        return b"+OK\r\n"
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
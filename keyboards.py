@@ -1,154 +1,138 @@
+from collections import OrderedDict
+from typing import Sequence, Tuple
+
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+KEYBOARD_CACHE_SIZE = 1000  # stamped keyboards kept per template
+
+
+# --------------------------------------------------
+# TEMPLATES
+# --------------------------------------------------
+
+class KeyboardTemplate:
+    """
+    Button layout of one mode, built once.
+
+    Calling it with a session id stamps the id into each button's
+    callback data. Stamped markups are kept in a small LRU, so
+    re-rendering a session's keyboard (e.g. on every rejection)
+    reuses the same object.
+    """
+
+    __slots__ = ("_rows", "_stamped")
+
+    def __init__(self, mode: str, rows: Sequence[Sequence[Tuple[str, str]]]):
+        # (label, callback prefix, callback suffix) around the session id
+        self._rows = tuple(
+            tuple((label, f"love|{mode}|", f"|{action}") for label, action in row)
+            for row in rows
+        )
+        self._stamped: "OrderedDict[str, InlineKeyboardMarkup]" = OrderedDict()
+
+    def __call__(self, session_id) -> InlineKeyboardMarkup:
+        key = str(session_id)
+        markup = self._stamped.get(key)
+        if markup is not None:
+            self._stamped.move_to_end(key)
+            return markup
+
+        markup = InlineKeyboardMarkup(
+            [
+                [InlineKeyboardButton(label, callback_data=head + key + tail) for label, head, tail in row]
+                for row in self._rows
+            ]
+        )
+        self._stamped[key] = markup
+        if len(self._stamped) > KEYBOARD_CACHE_SIZE:
+            self._stamped.popitem(last=False)
+        return markup
+
 
 # --------------------------------------------------
 # MAIN MENU
 # --------------------------------------------------
 
+MAIN_MENU = InlineKeyboardMarkup(
+    [
+        [InlineKeyboardButton("💘 Propose (Cinematic)", callback_data="menu|proposal")],
+        [InlineKeyboardButton("💌 Anonymous Crush Drop", callback_data="menu|crush")],
+        [InlineKeyboardButton("🎭 Prank Proposal", callback_data="menu|prank")],
+        [InlineKeyboardButton("💔 Breakup Mode", callback_data="menu|breakup")],
+        [InlineKeyboardButton("🏆 Loveboard Rankings", callback_data="menu|leaderboard")],
+        [InlineKeyboardButton("📖 Help + Commands", callback_data="menu|help")],
+    ]
+)
+
+
 def main_menu():
-    return InlineKeyboardMarkup(
-        [
-            [InlineKeyboardButton("💘 Propose (Cinematic)", callback_data="menu|proposal")],
-            [InlineKeyboardButton("💌 Anonymous Crush Drop", callback_data="menu|crush")],
-            [InlineKeyboardButton("🎭 Prank Proposal", callback_data="menu|prank")],
-            [InlineKeyboardButton("💔 Breakup Mode", callback_data="menu|breakup")],
-            [InlineKeyboardButton("🏆 Loveboard Rankings", callback_data="menu|leaderboard")],
-            [InlineKeyboardButton("📖 Help + Commands", callback_data="menu|help")],
-        ]
-    )
+    return MAIN_MENU
 
 
 # --------------------------------------------------
 # REAL PROPOSAL BUTTONS
 # --------------------------------------------------
 
-def proposal_start(session_id: str):
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    "💌 Confess in Style",
-                    callback_data=f"love|proposal|{session_id}|confess"
-                )
-            ]
-        ]
-    )
+proposal_start = KeyboardTemplate(
+    "proposal",
+    [
+        [("💌 Confess in Style", "confess")],
+    ]
+)
 
-
-def proposal_response(session_id: str):
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    "💖 Accept",
-                    callback_data=f"love|proposal|{session_id}|accept"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "🤔 Thinking (Drama)",
-                    callback_data=f"love|proposal|{session_id}|thinking"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "💔 No",
-                    callback_data=f"love|proposal|{session_id}|reject"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "🕵 Ask a Hint",
-                    callback_data=f"love|proposal|{session_id}|hint"
-                )
-            ],
-        ]
-    )
+proposal_response = KeyboardTemplate(
+    "proposal",
+    [
+        [("💖 Accept", "accept")],
+        [("🤔 Thinking (Drama)", "thinking")],
+        [("💔 No", "reject")],
+        [("🕵 Ask a Hint", "hint")],
+    ]
+)
 
 
 # --------------------------------------------------
 # ANONYMOUS CRUSH
 # --------------------------------------------------
 
-def crush_target(session_id: str):
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    "😏 Reveal Identity",
-                    callback_data=f"love|crush|{session_id}|reveal"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "🙈 Ignore for Now",
-                    callback_data=f"love|crush|{session_id}|ignore"
-                )
-            ]
-        ]
-    )
+crush_target = KeyboardTemplate(
+    "crush",
+    [
+        [("😏 Reveal Identity", "reveal")],
+        [("🙈 Ignore for Now", "ignore")],
+    ]
+)
 
-
-def crush_reveal_decision(session_id: str):
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    "💫 Yes, Reveal Me",
-                    callback_data=f"love|crush|{session_id}|yes_reveal"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "🔒 Keep It Secret",
-                    callback_data=f"love|crush|{session_id}|no_reveal"
-                )
-            ]
-        ]
-    )
+crush_reveal_decision = KeyboardTemplate(
+    "crush",
+    [
+        [("💫 Yes, Reveal Me", "yes_reveal")],
+        [("🔒 Keep It Secret", "no_reveal")],
+    ]
+)
 
 
 # --------------------------------------------------
 # PRANK MODE
 # --------------------------------------------------
 
-def prank_final(session_id: str):
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    "😱 Accept Scene",
-                    callback_data=f"love|prank|{session_id}|accept"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "😂 Call Out Prank",
-                    callback_data=f"love|prank|{session_id}|prank_reveal"
-                )
-            ]
-        ]
-    )
+prank_final = KeyboardTemplate(
+    "prank",
+    [
+        [("😱 Accept Scene", "accept")],
+        [("😂 Call Out Prank", "prank_reveal")],
+    ]
+)
 
 
 # --------------------------------------------------
 # BREAKUP MODE
 # --------------------------------------------------
 
-def breakup_confirm(session_id: str):
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    "💔 Confirm Breakup",
-                    callback_data=f"love|breakup|{session_id}|confirm"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "🥺 Save Relationship",
-                    callback_data=f"love|breakup|{session_id}|cancel"
-                )
-            ]
-        ]
-    )
+breakup_confirm = KeyboardTemplate(
+    "breakup",
+    [
+        [("💔 Confirm Breakup", "confirm")],
+        [("🥺 Save Relationship", "cancel")],
+    ]
+)
@@ -1,18 +1,89 @@
+import heapq
 import logging
-from typing import Dict, List, Tuple
-from storage import JSONStorage
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import metrics
+from storage import create_storage
 
 logger = logging.getLogger(__name__)
 
+STAT_FIELDS = ("proposals", "rejections", "pranks", "crushes")
+TOP_N = 10
+RENDER_CACHE_SIZE = 1000  # groups whose rendered loveboard is kept
+GLOBAL_KEY = "global"  # render cache key of the cross-group board
+
+
+class TopN:
+    """
+    Bounded ranking of the `size` highest scores.
+
+    Stats only ever grow, so a user outside the top N can only get in
+    through their own update; the index never needs a rescan.
+    Ties are broken by user id.
+    """
+
+    __slots__ = ("size", "_entries", "_scores")
+
+    def __init__(self, size: int = TOP_N):
+        self.size = size
+        self._entries: List[Tuple[int, str]] = []  # sorted (-score, user_id)
+        self._scores: Dict[str, int] = {}
+
+    @classmethod
+    def build(cls, scores: Iterable[Tuple[str, int]], size: int = TOP_N) -> "TopN":
+        ranking = cls(size)
+        ranking._entries = heapq.nsmallest(size, ((-score, user_id) for user_id, score in scores))
+        ranking._scores = {user_id: -score for score, user_id in ranking._entries}
+        return ranking
+
+    def update(self, user_id: str, score: int):
+        entry = (-score, user_id)
+        previous = self._scores.get(user_id)
+
+        if previous is not None:
+            if previous == score:
+                return
+            del self._entries[bisect_left(self._entries, (-previous, user_id))]
+        elif len(self._entries) >= self.size and entry >= self._entries[-1]:
+            return
+
+        insort(self._entries, entry)
+        self._scores[user_id] = score
+
+        if len(self._entries) > self.size:
+            _, dropped = self._entries.pop()
+            del self._scores[dropped]
+
+    def user_ids(self) -> List[str]:
+        return [user_id for _, user_id in self._entries]
+
 
 class Leaderboard:
     """
-    Tracks love statistics per group.
+    Tracks love statistics per group, plus cross-group totals.
     Persistent via JSON.
     """
 
-    def __init__(self):
-        self.storage = JSONStorage("leaderboard.json")
+    def __init__(self, storage_options: Optional[dict] = None, global_refresh_interval: float = 0):
+        self.storage = create_storage("leaderboard.json", columns=STAT_FIELDS, **(storage_options or {}))
+        # Per-group top-N by proposals, built on first read
+        self._rankings: Dict[str, TopN] = {}
+        # Cross-group totals per user, maintained on every record()
+        self._global_totals: Dict[str, Dict[str, int]] = {}
+        self._global_ranking: Optional[TopN] = None
+        # When other processes write to the same store, local totals go
+        # stale; rebuild them at most this often (0 = never needed)
+        self.global_refresh_interval = global_refresh_interval
+        self._global_built_at = 0.0
+        # LRU of rendered loveboard text, dropped whenever the group's stats change
+        self._rendered: "OrderedDict[str, str]" = OrderedDict()
+        self._invalidations = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        metrics.register("leaderboard", self.cache_stats)
 
     # --------------------------------------------------
     # INTERNAL STRUCTURE
@@ -30,74 +101,161 @@ class Leaderboard:
     # }
     # --------------------------------------------------
 
-    async def _ensure_user(self, group_id: int, user_id: int):
-        group_data = await self.storage.get(str(group_id), {})
-        if str(user_id) not in group_data:
-            group_data[str(user_id)] = {
-                "proposals": 0,
-                "rejections": 0,
-                "pranks": 0,
-                "crushes": 0
-            }
-            await self.storage.set(str(group_id), group_data)
-
     # --------------------------------------------------
     # STAT UPDATERS
     # --------------------------------------------------
 
+    async def record(self, group_id: int, user_id: int, **deltas: int) -> Dict[str, int]:
+        """
+        Apply one or more stat deltas, e.g. record(g, u, proposals=1).
+        Creates the user if missing; costs exactly one storage write.
+        Returns the user's updated stats.
+        """
+        unknown = set(deltas) - set(STAT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown leaderboard stats: {', '.join(sorted(unknown))}")
+
+        stats = await self.storage.increment_fields(
+            str(group_id),
+            str(user_id),
+            deltas,
+            defaults=dict.fromkeys(STAT_FIELDS, 0)
+        )
+
+        ranking = self._rankings.get(str(group_id))
+        if ranking is not None:
+            ranking.update(str(user_id), stats["proposals"])
+
+        if self._global_ranking is not None:
+            totals = self._global_totals.setdefault(str(user_id), dict.fromkeys(STAT_FIELDS, 0))
+            for field, amount in deltas.items():
+                totals[field] += amount
+            self._global_ranking.update(str(user_id), totals["proposals"])
+
+        self._invalidate(str(group_id))
+        self._invalidate(GLOBAL_KEY)
+        return stats
+
     async def add_proposal(self, group_id: int, user_id: int):
-        await self._ensure_user(group_id, user_id)
-        group_data = await self.storage.get(str(group_id))
-        group_data[str(user_id)]["proposals"] += 1
-        await self.storage.set(str(group_id), group_data)
+        await self.record(group_id, user_id, proposals=1)
 
     async def add_rejection(self, group_id: int, user_id: int):
-        await self._ensure_user(group_id, user_id)
-        group_data = await self.storage.get(str(group_id))
-        group_data[str(user_id)]["rejections"] += 1
-        await self.storage.set(str(group_id), group_data)
+        await self.record(group_id, user_id, rejections=1)
 
     async def add_prank(self, group_id: int, user_id: int):
-        await self._ensure_user(group_id, user_id)
-        group_data = await self.storage.get(str(group_id))
-        group_data[str(user_id)]["pranks"] += 1
-        await self.storage.set(str(group_id), group_data)
+        await self.record(group_id, user_id, pranks=1)
 
     async def add_crush(self, group_id: int, user_id: int):
-        await self._ensure_user(group_id, user_id)
-        group_data = await self.storage.get(str(group_id))
-        group_data[str(user_id)]["crushes"] += 1
-        await self.storage.set(str(group_id), group_data)
+        await self.record(group_id, user_id, crushes=1)
 
     # --------------------------------------------------
     # RANKING LOGIC
     # --------------------------------------------------
 
+    async def _group_index(self, group_id: int) -> TopN:
+        key = str(group_id)
+        ranking = self._rankings.get(key)
+        if ranking is None:
+            invalidations = self._invalidations
+            group_data: Dict[str, dict] = await self.storage.get(key, {})
+            ranking = TopN.build((user_id, stats["proposals"]) for user_id, stats in group_data.items())
+
+            # A record() finishing during the read found no index to update,
+            # and the index is never rescanned: only install it if none did
+            if invalidations == self._invalidations:
+                ranking = self._rankings.setdefault(key, ranking)
+        return ranking
+
     async def get_group_ranking(self, group_id: int) -> List[Tuple[str, dict]]:
-        group_data: Dict[str, dict] = await self.storage.get(str(group_id), {})
-        sorted_users = sorted(
-            group_data.items(),
-            key=lambda x: x[1]["proposals"],
-            reverse=True
+        """Top TOP_N users of the group by proposals."""
+        ranking = await self._group_index(group_id)
+        user_ids = ranking.user_ids()
+        stats = await self.storage.get_many(str(group_id), user_ids)
+        return [(user_id, stats[user_id]) for user_id in user_ids if user_id in stats]
+
+    async def rebuild_global(self):
+        """
+        Recompute the cross-group aggregates from stored per-group stats.
+        Runs at startup; call again after migrating or editing the store.
+        """
+        totals: Dict[str, Dict[str, int]] = {}
+        for group_data in (await self.storage.all()).values():
+            for user_id, stats in group_data.items():
+                user_totals = totals.setdefault(user_id, dict.fromkeys(STAT_FIELDS, 0))
+                for field in STAT_FIELDS:
+                    user_totals[field] += stats.get(field, 0)
+
+        self._global_totals = totals
+        self._global_ranking = TopN.build((user_id, stats["proposals"]) for user_id, stats in totals.items())
+        self._global_built_at = time.monotonic()
+        self._invalidate(GLOBAL_KEY)
+        logger.info(f"Rebuilt global loveboard from {len(totals)} users")
+
+    async def _refresh_global(self):
+        stale = (
+            self.global_refresh_interval > 0
+            and time.monotonic() - self._global_built_at >= self.global_refresh_interval
         )
-        return sorted_users
+        if self._global_ranking is None or stale:
+            await self.rebuild_global()
+
+    async def get_global_ranking(self) -> List[Tuple[str, dict]]:
+        """Top TOP_N users across all groups by total proposals."""
+        await self._refresh_global()
+        return [
+            (user_id, dict(self._global_totals[user_id]))
+            for user_id in self._global_ranking.user_ids()
+        ]
 
     async def format_leaderboard(self, group_id: int) -> str:
-        ranking = await self.get_group_ranking(group_id)
+        return await self._cached_render(
+            str(group_id),
+            lambda: self.get_group_ranking(group_id),
+            "🏆 **Loveboard Rankings**",
+            "🏆 No love stories yet in this group..."
+        )
+
+    async def format_global_leaderboard(self) -> str:
+        await self._refresh_global()
+        return await self._cached_render(
+            GLOBAL_KEY,
+            self.get_global_ranking,
+            "🌍 **Global Loveboard**",
+            "🌍 No love stories anywhere yet..."
+        )
 
+    async def _cached_render(self, key: str, load_ranking, header: str, empty_text: str) -> str:
+        text = self._rendered.get(key)
+        if text is not None:
+            self._rendered.move_to_end(key)
+            self.cache_hits += 1
+            return text
+
+        self.cache_misses += 1
+        invalidations = self._invalidations
+        text = self._render(await load_ranking(), header, empty_text)
+
+        # Skip caching if stats changed while the ranking was being read
+        if invalidations == self._invalidations:
+            self._rendered[key] = text
+            if len(self._rendered) > RENDER_CACHE_SIZE:
+                self._rendered.popitem(last=False)
+        return text
+
+    def _render(self, ranking: List[Tuple[str, dict]], header: str, empty_text: str) -> str:
         if not ranking:
-            return "🏆 No love stories yet in this group..."
+            return empty_text
 
-        text = "🏆 **Loveboard Rankings**\n\n"
+        parts = [f"{header}\n\n"]
 
         medals = ["🥇", "🥈", "🥉"]
 
-        for index, (user_id, stats) in enumerate(ranking[:10]):
+        for index, (user_id, stats) in enumerate(ranking[:TOP_N]):
             medal = medals[index] if index < 3 else "💎"
 
             title = self._get_title(index)
 
-            text += (
+            parts.append(
                 f"{medal} {title}\n"
                 f"👤 User: `{user_id}`\n"
                 f"💘 Proposals: {stats['proposals']}\n"
@@ -106,7 +264,22 @@ class Leaderboard:
                 f"💌 Crushes: {stats['crushes']}\n\n"
             )
 
-        return text
+        return "".join(parts)
+
+    # --------------------------------------------------
+    # RENDER CACHE
+    # --------------------------------------------------
+
+    def _invalidate(self, key: str):
+        self._invalidations += 1
+        self._rendered.pop(key, None)
+
+    def cache_stats(self) -> dict:
+        return {
+            "cached_groups": len(self._rendered),
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+        }
 
     # --------------------------------------------------
     # TITLE SYSTEM
@@ -1,5 +1,5 @@
+import asyncio
 import logging
-from typing import Optional
 
 from pyrogram import Client, filters, idle
 from pyrogram.enums import ChatType
@@ -7,13 +7,24 @@ from pyrogram.types import CallbackQuery, Message
 
 from breakup_engine import BreakupEngine
 from config import Config
+from couple_registry import CoupleRegistry
 from crush_engine import CrushEngine
+from dispatch import CallbackData, CallbackDispatcher, CommandDispatcher
+from effects import EffectScheduler
 from keyboards import main_menu
 from leaderboard import Leaderboard
+import metrics
+from outbound import Outbound
 from prank_engine import PrankEngine
 from proposal_engine import ProposalEngine
-from session_manager import SessionManager
-from utils import help_text, random_vibe, welcome_text
+from ratelimit import AntiSpam
+from scheduler import FairScheduler
+from session_journal import SessionJournal
+from session_manager import InMemorySessionStore, Session, SessionManager, SessionStore
+from sharding import receive_updates, run_supervisor, shard_filter
+from storage import flush_all
+from user_cache import UserCache
+from utils import HELP_TEXT, expired_message, overloaded_message, random_vibe, welcome_text
 
 
 # --------------------------------------------------
@@ -35,17 +46,30 @@ logger = logging.getLogger(__name__)
 config = Config.load()
 
 
+# --------------------------------------------------
+# SHARD SUPERVISOR
+# Branches off before any bot state is built: the supervisor
+# only receives updates and forwards each to its shard.
+# --------------------------------------------------
+
+if __name__ == "__main__" and config.sharded and config.SHARD_INDEX is None:
+    run_supervisor(config)
+    raise SystemExit
+
+
 # --------------------------------------------------
 # INITIALIZE BOT CLIENT
 # --------------------------------------------------
 
 app = Client(
-    name="love-game-bot",
+    name="love-game-bot" if config.SHARD_INDEX is None else f"love-game-bot-{config.SHARD_INDEX}",
     api_id=config.API_ID,
     api_hash=config.API_HASH,
     bot_token=config.BOT_TOKEN,
     in_memory=True,
     workers=50,
+    # Shards get their updates from the supervisor, not from Telegram
+    no_updates=config.sharded,
 )
 
 
@@ -53,77 +77,108 @@ app = Client(
 # CORE SYSTEMS
 # --------------------------------------------------
 
-session_manager = SessionManager()
-leaderboard = Leaderboard()
 
-proposal_engine = ProposalEngine(app, session_manager, leaderboard)
-crush_engine = CrushEngine(app, session_manager, leaderboard)
-prank_engine = PrankEngine(app, session_manager, leaderboard)
-breakup_engine = BreakupEngine(app, session_manager)
+def _session_store() -> SessionStore:
+    if config.SESSION_STORE_URL:
+        # Shared across replicas; only needs the redis client when enabled
+        from redis_session_store import RedisSessionStore
+        return RedisSessionStore(config.SESSION_STORE_URL)
+    return InMemorySessionStore(
+        SessionJournal(config.session_state_path()) if config.SESSION_STATE_PATH else None
+    )
+
+
+session_manager = SessionManager(_session_store())
+# Other shards write to the shared database, so refresh global totals from it
+leaderboard = Leaderboard(config.storage_options(), global_refresh_interval=60 if config.sharded else 0)
+couples = CoupleRegistry(config.storage_options())
+users = UserCache(app)
+effects = EffectScheduler()
+scheduler = FairScheduler()
+antispam = AntiSpam()
+outbound = Outbound(app)
+session_manager.on_end = effects.cancel
+
+proposal_engine = ProposalEngine(app, session_manager, leaderboard, couples, users, effects, outbound)
+crush_engine = CrushEngine(app, session_manager, leaderboard, users, outbound)
+prank_engine = PrankEngine(app, session_manager, leaderboard, users, outbound)
+breakup_engine = BreakupEngine(app, session_manager, couples, users, effects, outbound)
+
+callbacks = CallbackDispatcher()
+for engine in (proposal_engine, crush_engine, prank_engine, breakup_engine):
+    engine.register(callbacks)
+
+
+# --------------------------------------------------
+# SESSION EXPIRY
+# --------------------------------------------------
+
+
+async def _mark_session_expired(session: Session):
+    """Show the timeout on the story's message so stale buttons aren't pressed."""
+    effects.cancel(session.group_id, session.session_id)
+    if session.message_id is None:
+        return
+    await outbound.edit_message(session.group_id, session.message_id, expired_message())
+
+
+session_manager.on_expire = _mark_session_expired
 
 
 # --------------------------------------------------
 # COMMAND ROUTING
 # --------------------------------------------------
 
-SUPPORTED_COMMANDS = [
-    "love",
-    "propose",
-    "crush",
-    "prank",
-    "breakup",
-    "loveboard",
-    "help",
-    "vibe",
-]
+async def _cmd_love(message: Message):
+    await outbound.reply(message, welcome_text(), reply_markup=main_menu())
 
-BOT_USERNAME: Optional[str] = None
 
+async def _cmd_loveboard(message: Message):
+    args = message.command[1:]
+    if args and args[0].lower() == "global":
+        text = await leaderboard.format_global_leaderboard()
+    else:
+        text = await leaderboard.format_leaderboard(message.chat.id)
+    await outbound.reply(message, text)
 
-async def _resolve_command(message: Message) -> Optional[str]:
-    if not message.text:
-        return None
 
-    token = message.text.split(maxsplit=1)[0].strip()
-    if not token.startswith("/"):
-        return None
+async def _cmd_help(message: Message):
+    await outbound.reply(message, HELP_TEXT)
 
-    core = token[1:]
-    command = core
-    mention = None
 
-    if "@" in core:
-        command, mention = core.split("@", 1)
+async def _cmd_vibe(message: Message):
+    await outbound.reply(message, random_vibe())
 
-    command = command.lower()
-    if command not in SUPPORTED_COMMANDS:
-        return None
 
-    global BOT_USERNAME
-    if mention:
-        if BOT_USERNAME is None:
-            me = await app.get_me()
-            BOT_USERNAME = (me.username or "").lower()
-        if mention.lower() != BOT_USERNAME:
-            return None
+commands = CommandDispatcher(app)
+commands.register("love", _cmd_love)
+commands.register("propose", proposal_engine.start)
+commands.register("crush", crush_engine.start)
+commands.register("prank", prank_engine.start)
+commands.register("breakup", breakup_engine.start)
+commands.register("loveboard", _cmd_loveboard)
+commands.register("help", _cmd_help)
+commands.register("vibe", _cmd_vibe)
 
-    return command
+GROUP_CHAT_TYPES = frozenset({ChatType.GROUP, ChatType.SUPERGROUP})
 
 
 def _is_group_chat(message: Message) -> bool:
-    chat_type = message.chat.type
-    return chat_type in {ChatType.GROUP, ChatType.SUPERGROUP}
+    return message.chat.type in GROUP_CHAT_TYPES
 
 
-@app.on_message(filters.command(SUPPORTED_COMMANDS, prefixes=["/"]))
-async def command_router(client: Client, message: Message):
+in_shard = shard_filter(config.SHARD_INDEX or 0, config.SHARD_COUNT)
+
+
+async def _route_command(message: Message):
     try:
-        command = await _resolve_command(message)
-        if not command:
+        resolved = await commands.resolve(message)
+        if not resolved:
             return
+        command, handler = resolved
 
         if not _is_group_chat(message):
-            await message.reply("This bot works in groups and supergroups only 💞")
+            await outbound.reply(message, "This bot works in groups and supergroups only 💞")
             return
 
         logger.info(
@@ -134,40 +189,26 @@ async def command_router(client: Client, message: Message):
             message.text,
         )
 
-        if command == "love":
-            await message.reply(welcome_text(), reply_markup=main_menu())
-            return
-
-        if command == "propose":
-            await proposal_engine.start(message)
-            return
-
-        if command == "crush":
-            await crush_engine.start(message)
-            return
+        await handler(message)
 
-        if command == "prank":
-            await prank_engine.start(message)
-            return
-
-        if command == "breakup":
-            await breakup_engine.start(message)
-            return
+    except Exception as exc:
+        logger.exception("Command handler error: %s", exc)
 
-        if command == "loveboard":
-            text = await leaderboard.format_leaderboard(message.chat.id)
-            await message.reply(text)
-            return
 
-        if command == "help":
-            await message.reply(help_text())
-            return
+@app.on_message(filters.command(commands.names, prefixes=["/"]) & in_shard)
+async def command_router(client: Client, message: Message):
+    if not antispam.allow(message.chat.id, message.from_user.id if message.from_user else None):
+        return
 
-        if command == "vibe":
-            await message.reply(random_vibe())
+    # Only queue here; the scheduler's workers take chats in turn
+    if scheduler.submit(message.chat.id, lambda: _route_command(message)):
+        return
 
+    try:
+        if scheduler.notice_due(message.chat.id):
+            await outbound.reply(message, overloaded_message())
     except Exception as exc:
-        logger.exception("Command handler error: %s", exc)
+        logger.exception("Command shed error: %s", exc)
 
 
 # --------------------------------------------------
@@ -175,55 +216,45 @@ async def command_router(client: Client, message: Message):
 # --------------------------------------------------
 
 
-@app.on_callback_query()
-async def callback_router(client: Client, callback: CallbackQuery):
-    try:
-        if not callback.data:
-            return
+async def _menu_leaderboard(callback: CallbackQuery, data: CallbackData):
+    text = await leaderboard.format_leaderboard(callback.message.chat.id)
+    await outbound.edit(callback.message, text)
 
-        if callback.data.startswith("menu|"):
-            action = callback.data.split("|", 1)[1]
-
-            if action == "leaderboard":
-                text = await leaderboard.format_leaderboard(callback.message.chat.id)
-                await callback.message.edit_text(text)
-                return
-
-            if action == "help":
-                await callback.message.edit_text(
-                    "📖 **Love Game Help**\n\n"
-                    "Reply to someone before starting a mode.\n"
-                    "Each love story runs separately.\n"
-                    "Sessions expire after 5 minutes.\n"
-                    "Cooldown: 20 seconds per mode.\n\n"
-                    "Bonus: /vibe se instant Valentine energy drop karo."
-                )
-                return
-
-            if action in {"proposal", "crush", "prank"}:
-                await callback.answer(
-                    "Is mode ko chalane ke liye kisi message par reply karke command use karo: "
-                    f"/{'propose' if action == 'proposal' else action}",
-                    show_alert=True,
-                )
-                return
-
-            if action == "breakup":
-                await callback.answer("Breakup mode start karne ke liye /breakup command use karo.", show_alert=True)
-                return
-
-            await callback.answer()
-            return
 
-        if callback.data.startswith("love|proposal"):
-            await proposal_engine.handle_callback(callback)
-        elif callback.data.startswith("love|crush"):
-            await crush_engine.handle_callback(callback)
-        elif callback.data.startswith("love|prank"):
-            await prank_engine.handle_callback(callback)
-        elif callback.data.startswith("love|breakup"):
-            await breakup_engine.handle_callback(callback)
-        else:
+async def _menu_help(callback: CallbackQuery, data: CallbackData):
+    await outbound.edit(
+        callback.message,
+        "📖 **Love Game Help**\n\n"
+        "Reply to someone before starting a mode.\n"
+        "Each love story runs separately.\n"
+        "Sessions expire after 5 minutes.\n"
+        "Cooldown: 20 seconds per mode.\n\n"
+        "Bonus: /vibe se instant Valentine energy drop karo."
+    )
+
+
+async def _menu_mode_hint(callback: CallbackQuery, data: CallbackData):
+    await callback.answer(
+        "Is mode ko chalane ke liye kisi message par reply karke command use karo: "
+        f"/{'propose' if data.action == 'proposal' else data.action}",
+        show_alert=True,
+    )
+
+
+async def _menu_breakup(callback: CallbackQuery, data: CallbackData):
+    await callback.answer("Breakup mode start karne ke liye /breakup command use karo.", show_alert=True)
+
+
+callbacks.register("menu", "", "leaderboard", _menu_leaderboard)
+callbacks.register("menu", "", "help", _menu_help)
+for mode in ("proposal", "crush", "prank"):
+    callbacks.register("menu", "", mode, _menu_mode_hint)
+callbacks.register("menu", "", "breakup", _menu_breakup)
+
+
+async def _route_callback(callback: CallbackQuery):
+    try:
+        if not await callbacks.dispatch(callback):
             await callback.answer("Unknown action.")
 
     except Exception as exc:
@@ -231,6 +262,22 @@ async def callback_router(client: Client, callback: CallbackQuery):
         await callback.answer("Something went wrong.")
 
 
+@app.on_callback_query(in_shard)
+async def callback_router(client: Client, callback: CallbackQuery):
+    chat_id = callback.message.chat.id if callback.message else 0
+    if not antispam.allow(chat_id, callback.from_user.id):
+        return
+
+    # Button presses jump ahead of the chat's queued commands
+    if scheduler.submit(chat_id, lambda: _route_callback(callback), priority=True):
+        return
+
+    try:
+        await callback.answer(overloaded_message())
+    except Exception as exc:
+        logger.exception("Callback shed error: %s", exc)
+
+
 # --------------------------------------------------
 # MAIN ENTRY
 # --------------------------------------------------
@@ -238,18 +285,33 @@ async def callback_router(client: Client, callback: CallbackQuery):
 
 async def main():
     logger.info("Starting Love Game Engine...")
+    await couples.load()
+    await leaderboard.rebuild_global()
+    await session_manager.restore()
+    scheduler.start()
     await app.start()
+    receiving = asyncio.create_task(receive_updates(app)) if config.sharded else None
     await session_manager.start()
+    if config.METRICS_INTERVAL > 0:
+        asyncio.create_task(metrics.report_forever(config.METRICS_INTERVAL))
 
     try:
-        global BOT_USERNAME
-        me = await app.get_me()
-        BOT_USERNAME = (me.username or "").lower()
+        await commands.refresh_username()
 
         logger.info("Love Game Engine is LIVE ❤️")
         await idle()
     finally:
-        await app.stop()
+        try:
+            if receiving is not None:
+                receiving.cancel()
+            # Let pending edits go out while the client can still send
+            await scheduler.stop()
+            await effects.shutdown()
+            await outbound.shutdown()
+            await app.stop()
+        finally:
+            await session_manager.save_state()
+            await flush_all()
 
 
 # --------------------------------------------------
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram.
+    Observations are in seconds; snapshots report milliseconds.
+    """
+
+    DEFAULT_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self) -> dict:
+        labels = [f"<={bound * 1000:g}ms" for bound in self.buckets] + ["+inf"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 2) if self.count else 0,
+            "max_ms": round(self.max * 1000, 2),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+# --------------------------------------------------
+# METRIC SOURCES
+# Components register a callable returning a dict of
+# their current stats; the reporter logs them all.
+# --------------------------------------------------
+
+_sources: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, source: Callable[[], dict]):
+    _sources[name] = source
+
+
+def collect() -> Dict[str, dict]:
+    stats = {}
+    for name, source in _sources.items():
+        try:
+            stats[name] = source()
+        except Exception as e:
+            logger.error(f"Metric source {name} failed: {e}")
+    return stats
+
+
+async def report_forever(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        logger.info("Metrics: %s", collect())
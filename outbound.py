@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait, MessageNotModified
+from pyrogram.types import InlineKeyboardMarkup, Message
+
+import metrics
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows roughly one message per second per chat and
+# ~30 per second overall; short bursts above that are tolerated
+CHAT_RATE = 1.0
+CHAT_BURST = 5
+GLOBAL_RATE = 30.0
+GLOBAL_BURST = 30
+MAX_FLOOD_RETRIES = 3
+RENDERED_CACHE_SIZE = 5000  # messages whose last sent content is remembered
+
+Call = Callable[[], Awaitable[Any]]
+
+
+class _Send:
+    __slots__ = ("call", "waiters", "merge_key", "queued_at")
+
+    def __init__(self, call: Call, waiter: asyncio.Future, merge_key: Optional[int]):
+        self.call = call
+        self.waiters: List[asyncio.Future] = [waiter]
+        self.merge_key = merge_key
+        self.queued_at = time.monotonic()
+
+
+class _ChatQueue:
+    __slots__ = ("sends", "bucket", "flood_until", "worker", "wakeup")
+
+    def __init__(self):
+        self.sends: Deque[_Send] = deque()
+        self.bucket = TokenBucket(CHAT_RATE, CHAT_BURST)
+        self.flood_until = 0.0
+        self.worker: Optional[asyncio.Task] = None
+        # Set when a send is queued, to end the worker's idle linger early
+        self.wakeup = asyncio.Event()
+
+
+class Outbound:
+    """
+    Single path for everything the bot sends or edits in a chat.
+
+    Sends are queued per chat and released through a per-chat and a
+    global token bucket. A FloodWait pauses that chat for the interval
+    Telegram asks for and retries, instead of losing the reply. An edit
+    of a message that is still queued replaces the queued edit, so only
+    the latest text goes out, and an edit that would not change what the
+    message already shows is skipped.
+    """
+
+    def __init__(self, app: Client):
+        self.app = app
+        self._chats: Dict[int, _ChatQueue] = {}
+        self._queued_edits: Dict[Tuple[int, int], _Send] = {}
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        # (chat_id, message_id) -> hash of the text + keyboard last sent
+        self._rendered: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+        self._depth = 0
+        self._in_flight = 0
+        self.sent = 0
+        self.merged = 0
+        self.flood_waits = 0
+        self.failed = 0
+        self.edits_skipped = 0
+        self.not_modified = 0
+        self.wait_time = metrics.LatencyHistogram()
+        metrics.register("outbound", self.stats)
+
+    # --------------------------------------------------
+    # SENDING
+    # --------------------------------------------------
+
+    async def reply(self, message: Message, text: str, **kwargs) -> Message:
+        sent = await self.submit(message.chat.id, lambda: message.reply(text, **kwargs))
+        if sent is not None:
+            self._remember((sent.chat.id, sent.id), _fingerprint(text, kwargs.get("reply_markup")))
+        return sent
+
+    async def edit(self, message: Message, text: str, **kwargs):
+        return await self._edit(
+            message.chat.id,
+            message.id,
+            lambda: message.edit_text(text, **kwargs),
+            _fingerprint(text, kwargs.get("reply_markup"))
+        )
+
+    async def edit_message(self, chat_id: int, message_id: int, text: str, **kwargs):
+        return await self._edit(
+            chat_id,
+            message_id,
+            lambda: self.app.edit_message_text(chat_id, message_id, text, **kwargs),
+            _fingerprint(text, kwargs.get("reply_markup"))
+        )
+
+    async def delete(self, message: Message):
+        self._rendered.pop((message.chat.id, message.id), None)
+        return await self.submit(message.chat.id, message.delete)
+
+    async def _edit(self, chat_id: int, message_id: int, call: Call, fingerprint: int):
+        key = (chat_id, message_id)
+        if self._rendered.get(key) == fingerprint:
+            self._rendered.move_to_end(key)
+            self.edits_skipped += 1
+            return None
+
+        self._remember(key, fingerprint)
+        try:
+            return await self.submit(chat_id, call, merge_key=message_id)
+        except MessageNotModified:
+            self.not_modified += 1
+            return None
+        except Exception:
+            # Unknown what the message shows now; don't skip the next edit
+            self._rendered.pop(key, None)
+            raise
+
+    def _remember(self, key: Tuple[int, int], fingerprint: int):
+        self._rendered[key] = fingerprint
+        self._rendered.move_to_end(key)
+        if len(self._rendered) > RENDERED_CACHE_SIZE:
+            self._rendered.popitem(last=False)
+
+    def submit(self, chat_id: int, call: Call, merge_key: Optional[int] = None) -> asyncio.Future:
+        """Queue `call()` for the chat; the future resolves with its result."""
+        future = asyncio.get_running_loop().create_future()
+
+        if merge_key is not None:
+            queued = self._queued_edits.get((chat_id, merge_key))
+            if queued is not None:
+                # Not sent yet: send only the newest version
+                queued.call = call
+                queued.waiters.append(future)
+                self.merged += 1
+                return future
+
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _ChatQueue()
+
+        send = _Send(call, future, merge_key)
+        chat.sends.append(send)
+        self._depth += 1
+        if merge_key is not None:
+            self._queued_edits[(chat_id, merge_key)] = send
+
+        if chat.worker is None:
+            chat.worker = asyncio.create_task(self._drain(chat_id, chat))
+        else:
+            chat.wakeup.set()
+        return future
+
+    # --------------------------------------------------
+    # WORKERS
+    # --------------------------------------------------
+
+    async def _drain(self, chat_id: int, chat: _ChatQueue):
+        try:
+            while True:
+                if not chat.sends:
+                    # Linger until the burst allowance is back, then forget the chat
+                    idle = chat.bucket.delay(cost=chat.bucket.capacity)
+                    if idle <= 0:
+                        break
+                    chat.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(chat.wakeup.wait(), idle)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                now = time.monotonic()
+                wait = max(chat.flood_until - now, chat.bucket.delay(now), self._global.delay(now))
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+
+                chat.bucket.try_take(now)
+                self._global.try_take(now)
+                send = chat.sends.popleft()
+                self._depth -= 1
+                if send.merge_key is not None:
+                    self._queued_edits.pop((chat_id, send.merge_key), None)
+                self.wait_time.observe(now - send.queued_at)
+
+                self._in_flight += 1
+                try:
+                    await self._run(chat_id, chat, send)
+                finally:
+                    self._in_flight -= 1
+        finally:
+            chat.worker = None
+            if not chat.sends:
+                self._chats.pop(chat_id, None)
+
+    async def _run(self, chat_id: int, chat: _ChatQueue, send: _Send):
+        for attempt in range(MAX_FLOOD_RETRIES + 1):
+            try:
+                result = await send.call()
+            except FloodWait as e:
+                self.flood_waits += 1
+                chat.flood_until = time.monotonic() + e.value
+                logger.warning(f"FloodWait of {e.value}s in chat {chat_id} (attempt {attempt + 1})")
+                if attempt == MAX_FLOOD_RETRIES:
+                    self._fail(send, e)
+                    return
+                await asyncio.sleep(e.value)
+            except Exception as e:
+                self._fail(send, e)
+                return
+            else:
+                self.sent += 1
+                for waiter in send.waiters:
+                    if not waiter.done():
+                        waiter.set_result(result)
+                return
+
+    def _fail(self, send: _Send, error: Exception):
+        self.failed += 1
+        for waiter in send.waiters:
+            if not waiter.done():
+                waiter.set_exception(error)
+
+    async def shutdown(self, timeout: float = 10):
+        """Give queued sends up to `timeout` seconds to go out, then stop."""
+        deadline = time.monotonic() + timeout
+        while (self._depth or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        if self._depth:
+            logger.warning(f"Dropping {self._depth} queued sends on shutdown")
+        for chat in list(self._chats.values()):
+            if chat.worker is not None:
+                chat.worker.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._depth,
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "merged": self.merged,
+            "flood_waits": self.flood_waits,
+            "failed": self.failed,
+            "edits_skipped": self.edits_skipped,
+            "not_modified": self.not_modified,
+            "wait": self.wait_time.snapshot(),
+        }
+
+
+def _fingerprint(text: str, markup: Optional[InlineKeyboardMarkup]) -> int:
+    buttons = None
+    if markup is not None:
+        buttons = tuple(
+            tuple((button.text, button.callback_data) for button in row)
+            for row in markup.inline_keyboard
+        )
+    return hash((text, buttons))
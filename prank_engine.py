@@ -1,12 +1,14 @@
 import logging
 from pyrogram import Client
 from pyrogram.types import Message, CallbackQuery
+from dispatch import CallbackData, CallbackDispatcher
 from session_manager import SessionManager
 from leaderboard import Leaderboard
 from keyboards import prank_final
+from outbound import Outbound
+from user_cache import UserCache
 from utils import (
     mention,
-    parse_callback,
     prank_dramatic,
     prank_reveal,
     not_yours_message,
@@ -22,11 +24,15 @@ class PrankEngine:
         self,
         app: Client,
         session_manager: SessionManager,
-        leaderboard: Leaderboard
+        leaderboard: Leaderboard,
+        users: UserCache,
+        outbound: Outbound
     ):
         self.app = app
         self.sessions = session_manager
         self.leaderboard = leaderboard
+        self.users = users
+        self.outbound = outbound
 
     # --------------------------------------------------
     # START PRANK
@@ -35,7 +41,7 @@ class PrankEngine:
     async def start(self, message: Message):
 
         if not message.reply_to_message:
-            await message.reply("Reply target select karo aur /prank se scene shuru karo 😈")
+            await self.outbound.reply(message, "Reply target select karo aur /prank se scene shuru karo 😈")
             return
 
         group_id = message.chat.id
@@ -50,29 +56,38 @@ class PrankEngine:
                 target_id=target.id
             )
         except Exception as e:
-            await message.reply(str(e))
+            await self.outbound.reply(message, str(e))
             return
 
+        self.users.seed(proposer)
+        self.users.seed(target)
+
         # Update leaderboard prank stat
-        await self.leaderboard.add_prank(group_id, proposer.id)
+        await self.leaderboard.record(group_id, proposer.id, pranks=1)
 
         dramatic_text = prank_dramatic(target.first_name)
 
-        await message.reply(
+        sent = await self.outbound.reply(
+            message,
             dramatic_text,
-            reply_markup=prank_final(session["session_id"])
+            reply_markup=prank_final(session.session_id)
         )
+        await self.sessions.attach_message(group_id, session.session_id, sent.id)
 
     # --------------------------------------------------
     # HANDLE CALLBACK
     # --------------------------------------------------
 
-    async def handle_callback(self, callback: CallbackQuery):
+    def register(self, dispatcher: CallbackDispatcher):
+        for action in ("accept", "prank_reveal"):
+            dispatcher.register("love", "prank", action, self.handle_callback)
+
+    async def handle_callback(self, callback: CallbackQuery, data: CallbackData):
 
-        prefix, mode, session_id, action = parse_callback(callback.data)
+        session_id, action = data.session_id, data.action
         group_id = callback.message.chat.id
 
-        session = self.sessions.get_session(group_id, session_id)
+        session = await self.sessions.get_session(group_id, session_id)
 
         if not session:
             await callback.answer(expired_message(), show_alert=True)
@@ -90,15 +105,16 @@ class PrankEngine:
             await callback.answer(not_yours_message(), show_alert=True)
             return
 
-        proposer = await self.app.get_users(session["proposer_id"])
-
         # --------------------------------------------------
         # TARGET PRESSES ACCEPT
         # --------------------------------------------------
 
-        if action == "accept" and user_id == session["target_id"]:
+        if action == "accept" and user_id == session.target_id:
+
+            proposer = await self.users.get(session.proposer_id)
 
-            await callback.message.edit_text(
+            await self.outbound.edit(
+                callback.message,
                 prank_reveal(mention(proposer.id, proposer.first_name)),
                 disable_web_page_preview=True
             )
@@ -110,9 +126,10 @@ class PrankEngine:
         # TARGET PRESSES 'IT'S A PRANK'
         # --------------------------------------------------
 
-        elif action == "prank_reveal" and user_id == session["target_id"]:
+        elif action == "prank_reveal" and user_id == session.target_id:
 
-            await callback.message.edit_text(
+            await self.outbound.edit(
+                callback.message,
                 "😂 You can’t prank the prank master.\n\nRespect earned. Aura +100.",
             )
 
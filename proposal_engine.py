@@ -1,17 +1,19 @@
 import logging
 from pyrogram import Client
 from pyrogram.types import Message, CallbackQuery
+from dispatch import CallbackData, CallbackDispatcher
 from session_manager import SessionManager
 from leaderboard import Leaderboard
-from storage import JSONStorage
+from couple_registry import CoupleRegistry
+from effects import EffectScheduler
+from outbound import Outbound
+from user_cache import UserCache
 from keyboards import proposal_start, proposal_response
 from utils import (
     mention,
-    parse_callback,
     proposal_build_up,
     proposal_success,
     proposal_rejection,
-    cinematic_delay,
     not_yours_message,
     expired_message
 )
@@ -25,12 +27,19 @@ class ProposalEngine:
         self,
         app: Client,
         session_manager: SessionManager,
-        leaderboard: Leaderboard
+        leaderboard: Leaderboard,
+        couples: CoupleRegistry,
+        users: UserCache,
+        effects: EffectScheduler,
+        outbound: Outbound
     ):
         self.app = app
         self.sessions = session_manager
         self.leaderboard = leaderboard
-        self.couples_storage = JSONStorage("couples.json")
+        self.couples = couples
+        self.users = users
+        self.effects = effects
+        self.outbound = outbound
 
     # --------------------------------------------------
     # START PROPOSAL
@@ -39,7 +48,7 @@ class ProposalEngine:
     async def start(self, message: Message):
 
         if not message.reply_to_message:
-            await message.reply("Kisi ke message par reply karke /propose maro, tabhi cinematic entry hogi 💘")
+            await self.outbound.reply(message, "Kisi ke message par reply karke /propose maro, tabhi cinematic entry hogi 💘")
             return
 
         group_id = message.chat.id
@@ -54,29 +63,38 @@ class ProposalEngine:
                 target_id=target.id
             )
         except Exception as e:
-            await message.reply(str(e))
+            await self.outbound.reply(message, str(e))
             return
 
+        self.users.seed(proposer)
+        self.users.seed(target)
+
         build_up = proposal_build_up(target.first_name)
 
-        await message.reply(
+        sent = await self.outbound.reply(
+            message,
             f"{build_up}\n\n"
             f"{mention(proposer.id, proposer.first_name)} "
             f"is about to confess something filmy…",
-            reply_markup=proposal_start(session["session_id"]),
+            reply_markup=proposal_start(session.session_id),
             disable_web_page_preview=True
         )
+        await self.sessions.attach_message(group_id, session.session_id, sent.id)
 
     # --------------------------------------------------
     # HANDLE CALLBACK
     # --------------------------------------------------
 
-    async def handle_callback(self, callback: CallbackQuery):
+    def register(self, dispatcher: CallbackDispatcher):
+        for action in ("confess", "accept", "reject", "thinking", "hint"):
+            dispatcher.register("love", "proposal", action, self.handle_callback)
+
+    async def handle_callback(self, callback: CallbackQuery, data: CallbackData):
 
-        prefix, mode, session_id, action = parse_callback(callback.data)
+        session_id, action = data.session_id, data.action
         group_id = callback.message.chat.id
 
-        session = self.sessions.get_session(group_id, session_id)
+        session = await self.sessions.get_session(group_id, session_id)
 
         if not session:
             await callback.answer(expired_message(), show_alert=True)
@@ -98,11 +116,12 @@ class ProposalEngine:
         # CONFESS STAGE
         # --------------------------------------------------
 
-        if action == "confess" and user_id == session["proposer_id"]:
-            self.sessions.update_stage(group_id, session_id, "confessed")
+        if action == "confess" and user_id == session.proposer_id:
+            await self.sessions.update_stage(group_id, session_id, "confessed")
 
-            await callback.message.edit_text(
-                f"{mention(session['target_id'], 'You')}...\n\n"
+            await self.outbound.edit(
+                callback.message,
+                f"{mention(session.target_id, 'You')}...\n\n"
                 "Someone has feelings for you. ❤️\n\n"
                 "Scene tumhare haath me hai.",
                 reply_markup=proposal_response(session_id),
@@ -114,25 +133,23 @@ class ProposalEngine:
         # ACCEPT
         # --------------------------------------------------
 
-        elif action == "accept" and user_id == session["target_id"]:
+        elif action == "accept" and user_id == session.target_id:
 
-            proposer = await self.app.get_users(session["proposer_id"])
-            target = await self.app.get_users(session["target_id"])
+            proposer = await self.users.get(session.proposer_id)
+            target = await self.users.get(session.target_id)
 
             success_text = proposal_success(
                 mention(proposer.id, proposer.first_name),
                 mention(target.id, target.first_name)
             )
 
-            await callback.message.edit_text(success_text)
+            await self.outbound.edit(callback.message, success_text)
 
             # Save couple
-            couples = await self.couples_storage.get(str(group_id), {})
-            couples[str(proposer.id)] = target.id
-            await self.couples_storage.set(str(group_id), couples)
+            await self.couples.pair(group_id, proposer.id, target.id)
 
             # Update leaderboard
-            await self.leaderboard.add_proposal(group_id, proposer.id)
+            await self.leaderboard.record(group_id, proposer.id, proposals=1)
 
             await self.sessions.end_session(group_id, session_id)
             await callback.answer("Proposal accepted. Couple goals unlocked 💞")
@@ -141,14 +158,15 @@ class ProposalEngine:
         # REJECT
         # --------------------------------------------------
 
-        elif action == "reject" and user_id == session["target_id"]:
+        elif action == "reject" and user_id == session.target_id:
 
-            self.sessions.increment_rejection(group_id, session_id)
+            rejection_count = await self.sessions.increment_rejection(group_id, session_id)
 
-            await self.leaderboard.add_rejection(group_id, session["proposer_id"])
+            await self.leaderboard.record(group_id, session.proposer_id, rejections=1)
 
-            if session["rejection_count"] >= 5:
-                await callback.message.edit_text(
+            if rejection_count >= 5:
+                await self.outbound.edit(
+                    callback.message,
                     "💔 Final rejection.\n\n"
                     "The love story ends here."
                 )
@@ -158,7 +176,8 @@ class ProposalEngine:
 
             await callback.answer("Ouch. Dil pe lagi 💔")
 
-            await callback.message.edit_text(
+            await self.outbound.edit(
+                callback.message,
                 proposal_rejection(),
                 reply_markup=proposal_response(session_id)
             )
@@ -167,18 +186,27 @@ class ProposalEngine:
         # THINKING
         # --------------------------------------------------
 
-        elif action == "thinking" and user_id == session["target_id"]:
+        elif action == "thinking" and user_id == session.target_id:
             await callback.answer("Thinking...")
-            await cinematic_delay(2)
-            await callback.answer("Still thinking... 🤔")
+
+            # Dramatic pause runs on a timer, not on this handler worker
+            async def still_thinking():
+                await self.outbound.edit(
+                    callback.message,
+                    "🤔 Still thinking...\n\n"
+                    "Poora group saans roke wait kar raha hai.",
+                    reply_markup=proposal_response(session_id)
+                )
+
+            self.effects.schedule(2, still_thinking, group_id, session_id)
 
         # --------------------------------------------------
         # HINT
         # --------------------------------------------------
 
-        elif action == "hint" and user_id == session["target_id"]:
+        elif action == "hint" and user_id == session.target_id:
 
-            proposer = await self.app.get_users(session["proposer_id"])
+            proposer = await self.users.get(session.proposer_id)
 
             await callback.answer(
                 f"Hint: Their name starts with '{proposer.first_name[0]}' 😉",
@@ -0,0 +1,142 @@
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Hashable, Optional
+
+import metrics
+
+# Anti-spam defaults: a user may burst 5 updates, then one every 2s;
+# a whole chat may burst 20, then 5 per second
+SPAM_USER_RATE = 0.5
+SPAM_USER_BURST = 5
+SPAM_CHAT_RATE = 5.0
+SPAM_CHAT_BURST = 20
+MAX_TRACKED_KEYS = 50000
+DROPPED_REPORT_SIZE = 5
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `capacity`.
+    Starts full, so a quiet caller gets its whole burst at once.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_take(self, now: Optional[float] = None, cost: float = 1) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def delay(self, now: Optional[float] = None, cost: float = 1) -> float:
+        """Seconds until `cost` tokens are available (0 if they already are)."""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class KeyedRateLimiter:
+    """
+    One token bucket per key, bounded in memory.
+
+    A bucket idle long enough to refill completely is the same as no
+    bucket, so those are evicted from the LRU end as new keys arrive.
+    While a key is throttled, its checks are one dict lookup.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = MAX_TRACKED_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._refill_time = burst / rate
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._blocked_until: Dict[Hashable, float] = {}
+
+    def allow(self, key: Hashable, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+
+        blocked_until = self._blocked_until.get(key)
+        if blocked_until is not None:
+            if now < blocked_until:
+                return False
+            del self._blocked_until[key]
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+            self._evict(now)
+        else:
+            self._buckets.move_to_end(key)
+
+        if bucket.try_take(now):
+            return True
+
+        self._blocked_until[key] = now + bucket.delay(now)
+        return False
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if len(buckets) <= self.max_keys and now - bucket.updated < self._refill_time:
+                break
+            buckets.popitem(last=False)
+            self._blocked_until.pop(key, None)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AntiSpam:
+    """
+    First gate for every incoming update: per-user and per-chat token
+    buckets. Throttled updates are dropped before any parsing or logging.
+    """
+
+    def __init__(
+        self,
+        user_rate: float = SPAM_USER_RATE,
+        user_burst: float = SPAM_USER_BURST,
+        chat_rate: float = SPAM_CHAT_RATE,
+        chat_burst: float = SPAM_CHAT_BURST
+    ):
+        self.users = KeyedRateLimiter(user_rate, user_burst)
+        self.chats = KeyedRateLimiter(chat_rate, chat_burst)
+        self.dropped = 0
+        self._dropped_by_chat: Counter = Counter()
+        metrics.register("antispam", self.stats)
+
+    def allow(self, chat_id: int, user_id: Optional[int]) -> bool:
+        now = time.monotonic()
+        if (user_id is None or self.users.allow(user_id, now)) and self.chats.allow(chat_id, now):
+            return True
+
+        self.dropped += 1
+        self._dropped_by_chat[chat_id] += 1
+        if len(self._dropped_by_chat) > MAX_TRACKED_KEYS:
+            self._dropped_by_chat.clear()
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "dropped": self.dropped,
+            "tracked_users": len(self.users),
+            "tracked_chats": len(self.chats),
+            "dropped_by_chat": {
+                str(chat_id): count
+                for chat_id, count in self._dropped_by_chat.most_common(DROPPED_REPORT_SIZE)
+            },
+        }
@@ -0,0 +1,184 @@
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import WatchError
+
+import metrics
+from session_manager import (
+    MAX_GROUP_SESSIONS,
+    MAX_USER_ACTIVE_SESSIONS,
+    MODE_COOLDOWN,
+    SESSION_TIMEOUT,
+    Session,
+    SessionStore,
+    new_session_id
+)
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "valentine"
+CAS_RETRIES = 10
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions and cooldowns in Redis, shared by every bot replica.
+
+    Per-group and per-user limits are enforced with WATCH/MULTI/EXEC
+    compare-and-set on the group's session index. Sessions, indexes and
+    cooldowns all carry native key TTLs, so Redis expires them without
+    a cleanup task (and the on_expire hook is never called).
+
+    keys:
+        <prefix>:s:<group_id>:<session_id>   session fields (JSON)
+        <prefix>:g:<group_id>                {session_id: [proposer_id, deadline]}
+        <prefix>:c:<group_id>:<user_id>:<mode>  cooldown start time
+    """
+
+    def __init__(self, url: str, prefix: str = KEY_PREFIX):
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+        self.cas_conflicts = 0
+        metrics.register("session_store", self.stats)
+
+    # --------------------------------------------------
+    # KEYS
+    # --------------------------------------------------
+
+    def _session_key(self, group_id: int, session_id: int) -> str:
+        return f"{self.prefix}:s:{group_id}:{session_id}"
+
+    def _group_key(self, group_id: int) -> str:
+        return f"{self.prefix}:g:{group_id}"
+
+    def _cooldown_key(self, group_id: int, user_id: int, mode: str) -> str:
+        return f"{self.prefix}:c:{group_id}:{user_id}:{mode}"
+
+    @staticmethod
+    def _live_index(raw: Optional[bytes], now: float) -> Dict[str, list]:
+        index = json.loads(raw) if raw else {}
+        return {session_id: entry for session_id, entry in index.items() if entry[1] > now}
+
+    # --------------------------------------------------
+    # SESSIONS
+    # --------------------------------------------------
+
+    async def create(self, group_id, mode, proposer_id, target_id) -> Session:
+        group_key = self._group_key(group_id)
+        cooldown_key = self._cooldown_key(group_id, proposer_id, mode)
+
+        for _ in range(CAS_RETRIES):
+            async with self.redis.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(group_key, cooldown_key)
+                    now = time.time()
+                    index = self._live_index(await pipe.get(group_key), now)
+
+                    if len(index) >= MAX_GROUP_SESSIONS:
+                        raise ValueError("Too many active love stories in this group. Try again in a moment.")
+
+                    active_by_proposer = sum(1 for proposer, _ in index.values() if proposer == proposer_id)
+                    if active_by_proposer >= MAX_USER_ACTIVE_SESSIONS:
+                        raise ValueError("You already have too many active stories. Finish one first.")
+
+                    last_used = await pipe.get(cooldown_key)
+                    if last_used is not None:
+                        wait_left = int(MODE_COOLDOWN - (now - float(last_used)))
+                        raise ValueError(f"Cooldown active. Please wait {wait_left}s before using /{mode} again.")
+
+                    session_id = new_session_id()
+                    while str(session_id) in index:
+                        session_id = new_session_id()
+
+                    session = Session(session_id, group_id, mode, proposer_id, target_id, now)
+                    index[str(session_id)] = [proposer_id, now + SESSION_TIMEOUT]
+
+                    pipe.multi()
+                    pipe.set(group_key, json.dumps(index), px=SESSION_TIMEOUT * 1000)
+                    pipe.set(
+                        self._session_key(group_id, session_id),
+                        json.dumps(session.to_dict()),
+                        px=SESSION_TIMEOUT * 1000
+                    )
+                    pipe.set(cooldown_key, repr(now), px=MODE_COOLDOWN * 1000)
+                    await pipe.execute()
+                    return session
+                except WatchError:
+                    self.cas_conflicts += 1
+
+        raise ValueError("Love traffic is heavy right now. Try again in a moment.")
+
+    async def get(self, group_id, session_id) -> Optional[Session]:
+        raw = await self.redis.get(self._session_key(group_id, session_id))
+        return Session.from_dict(json.loads(raw)) if raw else None
+
+    async def _modify(self, group_id, session_id, change: Callable[[Session], Any]) -> Optional[Session]:
+        key = self._session_key(group_id, session_id)
+
+        for _ in range(CAS_RETRIES):
+            async with self.redis.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    if raw is None:
+                        return None
+                    session = Session.from_dict(json.loads(raw))
+                    change(session)
+
+                    pipe.multi()
+                    pipe.set(key, json.dumps(session.to_dict()), keepttl=True)
+                    await pipe.execute()
+                    return session
+                except WatchError:
+                    self.cas_conflicts += 1
+
+        raise RuntimeError(f"Session {session_id} kept changing during update")
+
+    async def update(self, group_id, session_id, **fields) -> Optional[Session]:
+        def apply(session: Session):
+            for field, value in fields.items():
+                setattr(session, field, value)
+
+        return await self._modify(group_id, session_id, apply)
+
+    async def increment_rejection(self, group_id, session_id) -> int:
+        def bump(session: Session):
+            session.rejection_count += 1
+
+        session = await self._modify(group_id, session_id, bump)
+        return session.rejection_count if session else 0
+
+    async def end(self, group_id, session_id) -> Optional[Session]:
+        group_key = self._group_key(group_id)
+        key = self._session_key(group_id, session_id)
+
+        for _ in range(CAS_RETRIES):
+            async with self.redis.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(group_key, key)
+                    raw = await pipe.get(key)
+                    index = self._live_index(await pipe.get(group_key), time.time())
+                    index.pop(str(session_id), None)
+
+                    pipe.multi()
+                    pipe.delete(key)
+                    if index:
+                        pipe.set(group_key, json.dumps(index), keepttl=True)
+                    else:
+                        pipe.delete(group_key)
+                    await pipe.execute()
+                    return Session.from_dict(json.loads(raw)) if raw else None
+                except WatchError:
+                    self.cas_conflicts += 1
+
+        raise RuntimeError(f"Session {session_id} kept changing during end")
+
+    async def save_state(self):
+        # Redis already holds the state; just release the connections
+        await self.redis.aclose()
+
+    def stats(self) -> dict:
+        return {"cas_conflicts": self.cas_conflicts}
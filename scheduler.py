@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_WORKERS = 50
+MAX_CHAT_BACKLOG = 20  # queued commands per chat before new ones are shed
+MAX_CHAT_CALLBACKS = 20  # queued button presses per chat, bounded apart from commands
+MAX_CHAT_RUNNING = 2  # updates of one chat handled at the same time
+SHED_NOTICE_INTERVAL = 30  # seconds between "too busy" replies per chat
+BACKLOG_REPORT_SIZE = 5  # busiest chats listed in metrics
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class _ChatBacklog:
+    __slots__ = ("callbacks", "commands", "running")
+
+    def __init__(self):
+        self.callbacks: Deque[Job] = deque()
+        self.commands: Deque[Job] = deque()
+        self.running = 0
+
+    def __len__(self):
+        return len(self.callbacks) + len(self.commands)
+
+
+class FairScheduler:
+    """
+    Runs incoming updates round-robin across chats.
+
+    Each chat gets its own bounded queue, and workers take one update
+    from each waiting chat in turn. A chat with `max_chat_running`
+    updates in flight leaves the turn order until one finishes, so a
+    flooded group stuck behind its send limits can't hold every worker.
+    Within a chat, button presses go before new commands.
+    """
+
+    def __init__(
+        self,
+        workers: int = SCHEDULER_WORKERS,
+        max_chat_backlog: int = MAX_CHAT_BACKLOG,
+        max_chat_callbacks: int = MAX_CHAT_CALLBACKS,
+        max_chat_running: int = MAX_CHAT_RUNNING
+    ):
+        self.workers = workers
+        self.max_chat_backlog = max_chat_backlog
+        self.max_chat_callbacks = max_chat_callbacks
+        self.max_chat_running = max_chat_running
+        self._chats: Dict[int, _ChatBacklog] = {}
+        # chats with queued work and a free running slot, in turn order
+        self._ready: Deque[int] = deque()
+        self._last_notice: Dict[int, float] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._depth = 0
+        self.shed = 0
+        self.failed = 0
+        metrics.register("scheduler", self.stats)
+
+    def submit(self, chat_id: int, job: Job, priority: bool = False) -> bool:
+        """
+        Queue `job()` for the chat; False if its queue is full. Button
+        presses have their own bound, so a flood of commands can't shed them.
+        """
+        backlog = self._chats.get(chat_id)
+        if backlog is None:
+            backlog = self._chats[chat_id] = _ChatBacklog()
+
+        queue = backlog.callbacks if priority else backlog.commands
+        if len(queue) >= (self.max_chat_callbacks if priority else self.max_chat_backlog):
+            self.shed += 1
+            return False
+
+        if not backlog and backlog.running < self.max_chat_running:
+            self._ready.append(chat_id)
+        queue.append(job)
+        self._depth += 1
+        self._wakeup.set()
+        return True
+
+    def notice_due(self, chat_id: int) -> bool:
+        """Whether a shed update in this chat should get a "too busy" reply."""
+        now = time.monotonic()
+        if now - self._last_notice.get(chat_id, 0.0) < SHED_NOTICE_INTERVAL:
+            return False
+
+        self._last_notice[chat_id] = now
+        if len(self._last_notice) > len(self._chats) + 100:
+            self._last_notice = {
+                chat: noticed for chat, noticed in self._last_notice.items()
+                if now - noticed < SHED_NOTICE_INTERVAL
+            }
+        return True
+
+    def _next_job(self) -> Optional[Tuple[int, Job]]:
+        if not self._ready:
+            return None
+
+        chat_id = self._ready.popleft()
+        backlog = self._chats[chat_id]
+        job = backlog.callbacks.popleft() if backlog.callbacks else backlog.commands.popleft()
+        self._depth -= 1
+        backlog.running += 1
+
+        if backlog and backlog.running < self.max_chat_running:
+            self._ready.append(chat_id)
+        return chat_id, job
+
+    def _job_done(self, chat_id: int):
+        backlog = self._chats[chat_id]
+        backlog.running -= 1
+
+        if backlog:
+            # A chat at its running limit was out of the turn order
+            if backlog.running == self.max_chat_running - 1:
+                self._ready.append(chat_id)
+                self._wakeup.set()
+        elif not backlog.running:
+            del self._chats[chat_id]
+
+    async def _worker(self):
+        while True:
+            next_job = self._next_job()
+            if next_job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            chat_id, job = next_job
+            try:
+                await job()
+            except Exception as e:
+                self.failed += 1
+                logger.exception(f"Scheduled update failed: {e}")
+            finally:
+                self._job_done(chat_id)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        busiest = sorted(
+            ((len(backlog), chat_id) for chat_id, backlog in self._chats.items() if backlog),
+            reverse=True
+        )[:BACKLOG_REPORT_SIZE]
+        return {
+            "queued": self._depth,
+            "waiting_chats": len(self._ready),
+            "running": sum(backlog.running for backlog in self._chats.values()),
+            "shed": self.shed,
+            "failed": self.failed,
+            "backlog": {str(chat_id): size for size, chat_id in busiest},
+        }
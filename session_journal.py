@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from storage import append_log, replace_with_snapshot, replay_log
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FLUSH_INTERVAL = 2  # seconds between journal appends
+SNAPSHOT_INTERVAL = 60  # seconds between full snapshots
+
+
+class SessionJournal:
+    """
+    Optional on-disk copy of SessionManager state.
+
+    Mutations are only buffered in memory on the hot path. A background
+    task appends the buffer to `<path>.journal` every few seconds and
+    periodically replaces `<path>` with a full snapshot, truncating the
+    journal. All file I/O runs in the executor.
+
+    journal record formats:
+        ["create", {session fields}]
+        ["update", group_id, session_id, field, value]
+        ["end", group_id, session_id]
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+        snapshot_interval: float = SNAPSHOT_INTERVAL
+    ):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        self._buffer: List[str] = []
+        self._lock = asyncio.Lock()
+
+    # --------------------------------------------------
+    # HOT PATH
+    # --------------------------------------------------
+
+    def record(self, *entry: Any):
+        self._buffer.append(json.dumps(entry, separators=(",", ":")))
+
+    # --------------------------------------------------
+    # LOADING
+    # --------------------------------------------------
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Rebuild the session dicts from the snapshot plus journal."""
+        sessions: Dict[Tuple[int, int], Dict[str, Any]] = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    for data in json.load(f):
+                        sessions[(data["group_id"], data["session_id"])] = data
+            except Exception as e:
+                logger.error(f"Session snapshot load failed: {e}")
+
+        replay_log(sessions, self.journal_path, apply=self._apply)
+
+        return list(sessions.values())
+
+    @staticmethod
+    def _apply(sessions: Dict[Tuple[int, int], Dict[str, Any]], entry: List[Any]):
+        op = entry[0]
+        if op == "create":
+            data = entry[1]
+            sessions[(data["group_id"], data["session_id"])] = data
+        elif op == "update":
+            data = sessions.get((entry[1], entry[2]))
+            if data is not None:
+                data[entry[3]] = entry[4]
+        elif op == "end":
+            sessions.pop((entry[1], entry[2]), None)
+        else:
+            raise ValueError(f"Unknown journal op: {op}")
+
+    # --------------------------------------------------
+    # PERSISTENCE
+    # --------------------------------------------------
+
+    async def run(self, dump_sessions: Callable[[], List[Dict[str, Any]]]):
+        """Background loop: flush the journal, snapshot every `snapshot_interval`."""
+        last_snapshot = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                if time.monotonic() - last_snapshot >= self.snapshot_interval:
+                    await self.snapshot(dump_sessions)
+                    last_snapshot = time.monotonic()
+                else:
+                    await self.flush()
+            except Exception as e:
+                logger.error(f"Session journal write failed: {e}")
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        async with self._lock:
+            lines, self._buffer = self._buffer, []
+            await asyncio.get_running_loop().run_in_executor(None, self._append, lines)
+
+    async def snapshot(self, dump_sessions: Callable[[], List[Dict[str, Any]]]):
+        async with self._lock:
+            # Dump under the lock so nothing recorded while waiting for a
+            # running flush is dropped with the buffer
+            sessions = dump_sessions()
+            self._buffer = []
+            # The dicts are fresh copies, so encoding them off the loop is safe
+            await asyncio.get_running_loop().run_in_executor(None, self._replace, sessions)
+
+    def _append(self, lines: List[str]):
+        append_log(self.journal_path, "\n".join(lines) + "\n")
+
+    def _replace(self, sessions: List[Dict[str, Any]]):
+        replace_with_snapshot(self.path, self.journal_path, json.dumps(sessions, separators=(",", ":")))
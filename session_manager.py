@@ -1,7 +1,16 @@
 import asyncio
+import heapq
+import logging
+import random
+import sys
 import time
-import uuid
-from collections import defaultdict
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from session_journal import SessionJournal
+
+logger = logging.getLogger(__name__)
 
 SESSION_TIMEOUT = 300  # 5 minutes
 MODE_COOLDOWN = 20
@@ -9,10 +18,142 @@ MAX_GROUP_SESSIONS = 10
 MAX_USER_ACTIVE_SESSIONS = 3
 
 
-class SessionManager:
-    def __init__(self):
+class Session:
+    """
+    One love story. Slotted, with interned mode/stage/status strings
+    and an integer id, to keep per-session memory small.
+    """
+
+    __slots__ = (
+        "session_id",
+        "group_id",
+        "mode",
+        "proposer_id",
+        "target_id",
+        "rejection_count",
+        "stage",
+        "created_at",
+        "status",
+        "message_id",
+    )
+
+    def __init__(self, session_id: int, group_id: int, mode: str, proposer_id: int, target_id: int, created_at: float):
+        self.session_id = session_id
+        self.group_id = group_id
+        self.mode = sys.intern(mode)
+        self.proposer_id = proposer_id
+        self.target_id = target_id
+        self.rejection_count = 0
+        self.stage = "init"
+        self.created_at = created_at
+        self.status = "active"
+        self.message_id: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Session":
+        session = cls(
+            data["session_id"],
+            data["group_id"],
+            data["mode"],
+            data["proposer_id"],
+            data["target_id"],
+            data["created_at"]
+        )
+        session.rejection_count = data["rejection_count"]
+        session.stage = sys.intern(data["stage"])
+        session.status = sys.intern(data["status"])
+        session.message_id = data["message_id"]
+        return session
+
+    def __repr__(self):
+        return f"<Session {self.session_id} {self.mode}/{self.stage} group={self.group_id}>"
+
+
+def new_session_id() -> int:
+    return random.getrandbits(32)
+
+
+def is_expired(session: Session, now: Optional[float] = None) -> bool:
+    return ((now or time.time()) - session.created_at) >= SESSION_TIMEOUT
+
+
+def _session_key(session_id) -> Optional[int]:
+    """Session ids arrive as strings from callback data."""
+    if isinstance(session_id, int):
+        return session_id
+    try:
+        return int(session_id)
+    except (TypeError, ValueError):
+        return None
+
+
+class SessionStore(ABC):
+    """
+    Where session and cooldown state lives.
+
+    Stores own the limit checks in `create`, so they can enforce them
+    atomically for however many bot processes share the state.
+    """
+
+    # Optional async hook called with each session that times out
+    on_expire: Optional[Callable[[Session], Awaitable[None]]] = None
+
+    async def start(self):
+        """Start any background work."""
+
+    async def restore(self) -> int:
+        """Reload persisted sessions; returns how many came back."""
+        return 0
+
+    async def save_state(self):
+        """Persist state before shutdown."""
+
+    @abstractmethod
+    async def create(self, group_id: int, mode: str, proposer_id: int, target_id: int) -> Session:
+        """Create a session or raise ValueError with a user-facing reason."""
+
+    @abstractmethod
+    async def get(self, group_id: int, session_id: int) -> Optional[Session]:
+        pass
+
+    @abstractmethod
+    async def update(self, group_id: int, session_id: int, **fields: Any) -> Optional[Session]:
+        pass
+
+    @abstractmethod
+    async def increment_rejection(self, group_id: int, session_id: int) -> int:
+        """Returns the new rejection count (0 if the session is gone)."""
+
+    @abstractmethod
+    async def end(self, group_id: int, session_id: int) -> Optional[Session]:
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local sessions: the single-replica default.
+    Expiry runs off a deadline heap, limits off O(1) counters, and an
+    optional SessionJournal keeps state across restarts.
+    """
+
+    def __init__(self, journal: Optional[SessionJournal] = None):
         self.sessions = defaultdict(dict)
         self.cooldowns = defaultdict(dict)
+        # Optional persistence so active stories survive restarts
+        self.journal = journal
+        # Active sessions per (group_id, proposer_id)
+        self._active_by_user: Dict[Tuple[int, int], int] = {}
+        # (used_at, group_id, cooldown_key) in the order cooldowns started.
+        # MODE_COOLDOWN is fixed, so the oldest entry always lapses first.
+        self._cooldown_queue: Deque[Tuple[float, int, tuple]] = deque()
+        # Min-heap of (deadline, group_id, session_id). Ended sessions
+        # are left in place and skipped when their deadline pops.
+        self._expiry_heap: List[Tuple[float, int, int]] = []
+        self._expiry_wakeup = asyncio.Event()
+        self._hook_tasks = set()
         self._cleanup_running = False
 
     async def start(self):
@@ -20,76 +161,233 @@ class SessionManager:
         if not self._cleanup_running:
             self._cleanup_running = True
             asyncio.create_task(self._cleanup_task())
+            if self.journal:
+                asyncio.create_task(self.journal.run(self._dump_sessions))
+
+    # --------------------------------------------------
+    # PERSISTENCE
+    # --------------------------------------------------
+
+    async def restore(self) -> int:
+        """Reload sessions still inside SESSION_TIMEOUT. Call before start()."""
+        if not self.journal:
+            return 0
+
+        saved = await asyncio.get_running_loop().run_in_executor(None, self.journal.load)
+        now = time.time()
+        restored = 0
+        for data in saved:
+            session = Session.from_dict(data)
+            if is_expired(session, now):
+                continue
+            self.sessions[session.group_id][session.session_id] = session
+            user_key = (session.group_id, session.proposer_id)
+            self._active_by_user[user_key] = self._active_by_user.get(user_key, 0) + 1
+            heapq.heappush(self._expiry_heap, (session.created_at + SESSION_TIMEOUT, session.group_id, session.session_id))
+            restored += 1
+
+        # Start from a clean snapshot of what survived
+        await self.journal.snapshot(self._dump_sessions)
+        self._expiry_wakeup.set()
+        logger.info(f"Restored {restored} active sessions")
+        return restored
+
+    async def save_state(self):
+        """Write a final snapshot, e.g. on shutdown."""
+        if self.journal:
+            await self.journal.snapshot(self._dump_sessions)
+
+    def _dump_sessions(self) -> List[Dict[str, Any]]:
+        return [
+            session.to_dict()
+            for group_sessions in self.sessions.values()
+            for session in group_sessions.values()
+        ]
+
+    def _record(self, *entry):
+        if self.journal:
+            self.journal.record(*entry)
+
+    # --------------------------------------------------
+    # EXPIRY
+    # --------------------------------------------------
 
     async def _cleanup_task(self):
         while True:
+            self._expiry_wakeup.clear()
             now = time.time()
-            for group_id in list(self.sessions.keys()):
-                for session_id in list(self.sessions[group_id].keys()):
-                    session = self.sessions[group_id][session_id]
-                    if now - session["created_at"] > SESSION_TIMEOUT:
-                        del self.sessions[group_id][session_id]
-                if not self.sessions[group_id]:
-                    del self.sessions[group_id]
-            await asyncio.sleep(30)
-
-    async def create_session(self, group_id, mode, proposer_id, target_id):
-        if len(self.sessions[group_id]) >= MAX_GROUP_SESSIONS:
+
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                _, group_id, session_id = heapq.heappop(self._expiry_heap)
+                session = self.sessions.get(group_id, {}).get(session_id)
+                if session and is_expired(session, now):
+                    await self._expire(session)
+            self._prune_cooldowns(now)
+
+            # Sleep until the next deadline; an empty heap sleeps until a session is created
+            timeout = self._expiry_heap[0][0] - now if self._expiry_heap else None
+            try:
+                await asyncio.wait_for(self._expiry_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _expire(self, session: Session):
+        await self.end(session.group_id, session.session_id)
+        if self.on_expire is not None:
+            task = asyncio.create_task(self._run_expire_hook(session))
+            self._hook_tasks.add(task)
+            task.add_done_callback(self._hook_tasks.discard)
+
+    async def _run_expire_hook(self, session: Session):
+        try:
+            await self.on_expire(session)
+        except Exception as e:
+            logger.warning(f"Session expiry hook failed: {e}")
+
+    def _prune_cooldowns(self, now):
+        queue = self._cooldown_queue
+        while queue and now - queue[0][0] >= MODE_COOLDOWN:
+            used_at, group_id, cooldown_key = queue.popleft()
+            group_cooldowns = self.cooldowns.get(group_id)
+            # Skip if the key was refreshed by a newer use
+            if group_cooldowns and group_cooldowns.get(cooldown_key) == used_at:
+                del group_cooldowns[cooldown_key]
+                if not group_cooldowns:
+                    del self.cooldowns[group_id]
+
+    # --------------------------------------------------
+    # SESSIONS
+    # --------------------------------------------------
+
+    async def create(self, group_id, mode, proposer_id, target_id) -> Session:
+        if len(self.sessions.get(group_id, {})) >= MAX_GROUP_SESSIONS:
             raise ValueError("Too many active love stories in this group. Try again in a moment.")
 
-        active_by_proposer = sum(
-            1 for session in self.sessions[group_id].values() if session["proposer_id"] == proposer_id
-        )
-        if active_by_proposer >= MAX_USER_ACTIVE_SESSIONS:
+        if self._active_by_user.get((group_id, proposer_id), 0) >= MAX_USER_ACTIVE_SESSIONS:
             raise ValueError("You already have too many active stories. Finish one first.")
 
         now = time.time()
+        self._prune_cooldowns(now)
         cooldown_key = (proposer_id, mode)
-        last_used = self.cooldowns[group_id].get(cooldown_key)
+        last_used = self.cooldowns.get(group_id, {}).get(cooldown_key)
         if last_used and now - last_used < MODE_COOLDOWN:
             wait_left = int(MODE_COOLDOWN - (now - last_used))
             raise ValueError(f"Cooldown active. Please wait {wait_left}s before using /{mode} again.")
 
-        session_id = str(uuid.uuid4())[:8]
-        session = {
-            "session_id": session_id,
-            "group_id": group_id,
-            "mode": mode,
-            "proposer_id": proposer_id,
-            "target_id": target_id,
-            "rejection_count": 0,
-            "stage": "init",
-            "created_at": now,
-            "status": "active",
-        }
-        self.sessions[group_id][session_id] = session
+        group_sessions = self.sessions[group_id]
+        session_id = new_session_id()
+        while session_id in group_sessions:
+            session_id = new_session_id()
+
+        session = Session(session_id, group_id, mode, proposer_id, target_id, now)
+        group_sessions[session_id] = session
+        self._record("create", session.to_dict())
         self.cooldowns[group_id][cooldown_key] = now
+        self._cooldown_queue.append((now, group_id, cooldown_key))
+        user_key = (group_id, proposer_id)
+        self._active_by_user[user_key] = self._active_by_user.get(user_key, 0) + 1
+
+        # Deadlines only grow, so only an empty heap needs to wake the cleaner
+        if not self._expiry_heap:
+            self._expiry_wakeup.set()
+        heapq.heappush(self._expiry_heap, (now + SESSION_TIMEOUT, group_id, session_id))
         return session
 
-    def get_session(self, group_id, session_id):
+    async def get(self, group_id, session_id) -> Optional[Session]:
         return self.sessions.get(group_id, {}).get(session_id)
 
-    def is_expired(self, session):
-        return (time.time() - session["created_at"]) > SESSION_TIMEOUT
+    async def update(self, group_id, session_id, **fields) -> Optional[Session]:
+        session = self.sessions.get(group_id, {}).get(session_id)
+        if session:
+            for field, value in fields.items():
+                setattr(session, field, value)
+                self._record("update", group_id, session_id, field, value)
+        return session
 
-    def validate_participant(self, session, user_id):
-        return user_id in {session["proposer_id"], session["target_id"]}
+    async def increment_rejection(self, group_id, session_id) -> int:
+        session = self.sessions.get(group_id, {}).get(session_id)
+        if not session:
+            return 0
+        session.rejection_count += 1
+        self._record("update", group_id, session_id, "rejection_count", session.rejection_count)
+        return session.rejection_count
 
-    def update_stage(self, group_id, session_id, stage):
-        session = self.get_session(group_id, session_id)
+    async def end(self, group_id, session_id) -> Optional[Session]:
+        if group_id not in self.sessions:
+            return None
+        session = self.sessions[group_id].pop(session_id, None)
+        if not self.sessions[group_id]:
+            del self.sessions[group_id]
         if session:
-            session["stage"] = stage
+            self._record("end", group_id, session_id)
+            user_key = (group_id, session.proposer_id)
+            remaining = self._active_by_user.get(user_key, 0) - 1
+            if remaining > 0:
+                self._active_by_user[user_key] = remaining
+            else:
+                self._active_by_user.pop(user_key, None)
+        return session
 
-    def increment_rejection(self, group_id, session_id):
-        session = self.get_session(group_id, session_id)
-        if session:
-            session["rejection_count"] += 1
+
+class SessionManager:
+    """
+    Front door the engines use for session state.
+    Defaults to process-local state; pass a shared store to run
+    several bot replicas against the same sessions and cooldowns.
+    """
+
+    def __init__(self, store: Optional[SessionStore] = None):
+        self.store = store or InMemorySessionStore()
+        # Called with (group_id, session_id) whenever an engine ends a session
+        self.on_end: Optional[Callable[[int, int], Any]] = None
+
+    @property
+    def on_expire(self) -> Optional[Callable[[Session], Awaitable[None]]]:
+        return self.store.on_expire
+
+    @on_expire.setter
+    def on_expire(self, hook: Optional[Callable[[Session], Awaitable[None]]]):
+        self.store.on_expire = hook
+
+    async def start(self):
+        await self.store.start()
+
+    async def restore(self) -> int:
+        return await self.store.restore()
+
+    async def save_state(self):
+        await self.store.save_state()
+
+    async def create_session(self, group_id, mode, proposer_id, target_id) -> Session:
+        return await self.store.create(group_id, mode, proposer_id, target_id)
+
+    async def get_session(self, group_id, session_id) -> Optional[Session]:
+        key = _session_key(session_id)
+        if key is None:
+            return None
+        return await self.store.get(group_id, key)
+
+    def is_expired(self, session: Session):
+        return is_expired(session)
+
+    def validate_participant(self, session: Session, user_id):
+        return user_id == session.proposer_id or user_id == session.target_id
+
+    async def attach_message(self, group_id, session_id, message_id):
+        """Remember the message carrying the session's buttons."""
+        await self.store.update(group_id, _session_key(session_id), message_id=message_id)
+
+    async def update_stage(self, group_id, session_id, stage):
+        await self.store.update(group_id, _session_key(session_id), stage=sys.intern(stage))
+
+    async def increment_rejection(self, group_id, session_id) -> int:
+        return await self.store.increment_rejection(group_id, _session_key(session_id))
 
     async def end_session(self, group_id, session_id):
-        if group_id in self.sessions:
-            self.sessions[group_id].pop(session_id, None)
-            if not self.sessions[group_id]:
-                del self.sessions[group_id]
+        key = _session_key(session_id)
+        await self.store.end(group_id, key)
+        if self.on_end is not None and key is not None:
+            self.on_end(group_id, key)
 
     async def delete_session(self, group_id, session_id):
         await self.end_session(group_id, session_id)
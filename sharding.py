@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from pyrogram import Client, filters, idle, raw, utils
+from pyrogram.handlers import RawUpdateHandler
+from pyrogram.raw.core import TLObject
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+RESTART_BACKOFF = 5  # seconds before a crashed shard is restarted
+MAX_FORWARD_BACKLOG = 10000  # updates queued per shard before new ones are dropped
+DROP_LOG_EVERY = 1000
+
+
+# --------------------------------------------------
+# GROUP AFFINITY
+# Every update of a chat is handled by exactly one shard,
+# which owns that group's sessions, cooldowns and limits.
+# --------------------------------------------------
+
+def shard_of(chat_id: int, shard_count: int) -> int:
+    return chat_id % shard_count
+
+
+def shard_filter(shard_index: int, shard_count: int):
+    """Pyrogram filter passing only updates whose chat belongs to this shard."""
+    if shard_count <= 1:
+        return filters.all
+
+    def owns(_, __, update) -> bool:
+        message = getattr(update, "message", None) or update
+        chat = getattr(message, "chat", None)
+        # Updates without a chat (e.g. inline-message callbacks) go to shard 0
+        if chat is None:
+            return shard_index == 0
+        return shard_of(chat.id, shard_count) == shard_index
+
+    return filters.create(owns, "ShardFilter")
+
+
+# --------------------------------------------------
+# SUPERVISOR
+# Only the supervisor's session receives updates from Telegram.
+# It passes each one, with the users and chats it references,
+# to the owning shard over that shard's stdin:
+# 4-byte big-endian length + serialized raw Updates.
+# Shards connect with no_updates=True, so nothing arrives twice.
+# --------------------------------------------------
+
+def update_chat_id(update) -> Optional[int]:
+    """Chat id of a raw update, as pyrogram reports it in `chat.id`."""
+    peer = getattr(update, "peer", None) or getattr(getattr(update, "message", None), "peer_id", None)
+    if peer is None:
+        return None
+    try:
+        return utils.get_peer_id(peer)
+    except ValueError:
+        return None
+
+
+class ShardSupervisor:
+    """
+    Runs `shard_count` copies of this bot, one per shard, restarting
+    any that exit, and forwards every incoming update to its shard.
+    """
+
+    def __init__(self, client: Client, shard_count: int):
+        self.client = client
+        self.shard_count = shard_count
+        self._queues: List[asyncio.Queue] = [
+            asyncio.Queue(MAX_FORWARD_BACKLOG) for _ in range(shard_count)
+        ]
+        self._processes: Dict[int, asyncio.subprocess.Process] = {}
+        self._stopping = False
+        self.dropped = 0
+        client.add_handler(RawUpdateHandler(self._forward))
+
+    async def _forward(self, client: Client, update, users: dict, chats: dict):
+        chat_id = update_chat_id(update)
+        # Updates without a chat (e.g. inline-message callbacks) go to shard 0
+        shard_index = 0 if chat_id is None else shard_of(chat_id, self.shard_count)
+        frame = raw.types.Updates(
+            updates=[update],
+            users=list(users.values()),
+            chats=list(chats.values()),
+            date=0,
+            seq=0
+        ).write()
+
+        try:
+            self._queues[shard_index].put_nowait(frame)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % DROP_LOG_EVERY == 1:
+                logger.warning(f"Shard {shard_index} is not keeping up, {self.dropped} updates dropped so far")
+
+    @staticmethod
+    async def _feed(process: asyncio.subprocess.Process, queue: asyncio.Queue):
+        while True:
+            frame = await queue.get()
+            process.stdin.write(len(frame).to_bytes(4, "big") + frame)
+            try:
+                await process.stdin.drain()
+            except ConnectionError:
+                return
+
+    async def _run_shard(self, shard_index: int):
+        while not self._stopping:
+            logger.info(f"Starting shard {shard_index}/{self.shard_count}")
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, sys.argv[0],
+                stdin=asyncio.subprocess.PIPE,
+                env=dict(os.environ, SHARD_INDEX=str(shard_index))
+            )
+            self._processes[shard_index] = process
+            if self._stopping:
+                process.terminate()
+
+            feeding = asyncio.create_task(self._feed(process, self._queues[shard_index]))
+            returncode = await process.wait()
+            feeding.cancel()
+
+            if self._stopping:
+                break
+            logger.error(f"Shard {shard_index} exited with code {returncode}, restarting")
+            await asyncio.sleep(RESTART_BACKOFF)
+
+    async def run(self):
+        await self.client.start()
+        shards = [asyncio.create_task(self._run_shard(i)) for i in range(self.shard_count)]
+        try:
+            await idle()
+        finally:
+            self._stopping = True
+            for process in self._processes.values():
+                if process.returncode is None:
+                    process.terminate()
+            await asyncio.gather(*shards, return_exceptions=True)
+            await self.client.stop()
+            logger.info("All shards stopped")
+
+
+def run_supervisor(config: Config):
+    client = Client(
+        name="love-game-bot-supervisor",
+        api_id=config.API_ID,
+        api_hash=config.API_HASH,
+        bot_token=config.BOT_TOKEN,
+        in_memory=True,
+        # One handler worker keeps updates in arrival order
+        workers=1,
+    )
+    client.run(ShardSupervisor(client, config.SHARD_COUNT).run())
+
+
+# --------------------------------------------------
+# SHARD SIDE
+# --------------------------------------------------
+
+async def receive_updates(client: Client):
+    """
+    Feed updates forwarded by the supervisor through the client's
+    handlers. Stops the shard when the supervisor goes away.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+
+    # no_updates=True also keeps pyrogram from starting its handler workers
+    dispatcher = client.dispatcher
+    workers = [
+        asyncio.create_task(dispatcher.handler_worker(asyncio.Lock()))
+        for _ in range(client.workers)
+    ]
+    try:
+        while True:
+            size = int.from_bytes(await reader.readexactly(4), "big")
+            frame = await reader.readexactly(size)
+            try:
+                await client.handle_updates(TLObject.read(BytesIO(frame)))
+            except Exception as e:
+                logger.exception(f"Forwarded update failed: {e}")
+    except asyncio.IncompleteReadError:
+        logger.error("Supervisor closed the update pipe, stopping")
+        os.kill(os.getpid(), signal.SIGTERM)
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
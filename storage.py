@@ -2,10 +2,23 @@ import json
 import asyncio
 import os
 import logging
-from typing import Dict, Any
+import sqlite3
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import metrics
 
 logger = logging.getLogger(__name__)
 
+LOG_COMPACT_THRESHOLD = 1024 * 1024  # bytes of log before a snapshot is taken
+FLUSH_EVERY = 100  # write-behind: mutations before an early flush
+SQLITE_PATH = "valentine.db"
+
+# Every open store, so shutdown can flush them all
+_open_storages = weakref.WeakSet()
+
 
 class JSONStorage:
     """
@@ -13,14 +26,24 @@ class JSONStorage:
     Used for:
     - Couples
     - Leaderboard
+
+    With `flush_interval` > 0 the store runs write-behind: mutations
+    only mark it dirty, and a background flusher persists at most once
+    per interval (or early, after `flush_every` mutations).
     """
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, flush_interval: float = 0, flush_every: int = FLUSH_EVERY):
         self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
         self._lock = asyncio.Lock()
         self._data: Dict[str, Any] = {}
+        self._dirty = 0
+        self._flush_task = None
+        self.save_latency = metrics.LatencyHistogram()
         self._ensure_file()
         self._load()
+        _open_storages.add(self)
 
     # --------------------------------------------------
     # INITIALIZATION
@@ -39,15 +62,51 @@ class JSONStorage:
             logger.error(f"Storage load failed: {e}")
             self._data = {}
 
+    def _write_snapshot(self, payload: str):
+        # Runs in the default executor, never on the event loop
+        write_atomic(self.file_path, payload)
+
     async def _save(self):
         async with self._lock:
-            temp_file = self.file_path + ".tmp"
+            self._dirty = 0
+            started = time.perf_counter()
             try:
-                with open(temp_file, "w") as f:
-                    json.dump(self._data, f, indent=4)
-                os.replace(temp_file, self.file_path)
+                # Serialize on the loop so the snapshot is consistent,
+                # then hand the file I/O to a worker thread
+                payload = json.dumps(self._data, indent=4)
+                await asyncio.get_running_loop().run_in_executor(None, self._write_snapshot, payload)
             except Exception as e:
                 logger.error(f"Storage save failed: {e}")
+            self.save_latency.observe(time.perf_counter() - started)
+
+    async def _commit(self, record: List[Any]):
+        """Persist a single mutation. The plain JSON store rewrites the file."""
+        if self.flush_interval <= 0:
+            await self._save()
+            return
+
+        self._dirty += 1
+        if self._dirty >= self.flush_every:
+            await self._save()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Mutations made while a save was running found this task still
+        # alive and armed no timer of their own, so keep going until clean
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if not self._dirty:
+                return
+
+    async def flush(self):
+        """Persist any pending write-behind mutations now."""
+        if self._dirty:
+            await self._save()
+
+    def stats(self) -> dict:
+        return {"pending": self._dirty, "save_latency": self.save_latency.snapshot()}
 
     # --------------------------------------------------
     # GENERIC METHODS
@@ -58,24 +117,511 @@ class JSONStorage:
 
     async def set(self, key: str, value: Any):
         self._data[key] = value
-        await self._save()
+        await self._commit(["set", key, value])
 
     async def delete(self, key: str):
         if key in self._data:
             del self._data[key]
-            await self._save()
+            await self._commit(["del", key])
 
     async def all(self):
         return self._data
 
+    async def get_many(self, main_key: str, sub_keys: Sequence[str]) -> Dict[str, Any]:
+        """Fetch selected nested records; missing ones are left out."""
+        group = self._data.get(main_key, {})
+        return {sub_key: group[sub_key] for sub_key in sub_keys if sub_key in group}
+
     async def update_nested(self, main_key: str, sub_key: str, value: Any):
         if main_key not in self._data:
             self._data[main_key] = {}
         self._data[main_key][sub_key] = value
-        await self._save()
+        await self._commit(["nset", main_key, sub_key, value])
+
+    async def update_nested_many(self, main_key: str, values: Dict[str, Any], deleted: Sequence[str] = ()):
+        """Set and delete several nested records as a single mutation."""
+        group = self._data.setdefault(main_key, {})
+        group.update(values)
+        for sub_key in deleted:
+            group.pop(sub_key, None)
+        if not group:
+            del self._data[main_key]
+        await self._commit(["nbatch", main_key, values, list(deleted)])
 
     async def increment_nested(self, main_key: str, sub_key: str, amount: int = 1):
         if main_key not in self._data:
             self._data[main_key] = {}
-        self._data[main_key][sub_key] = self._data[main_key].get(sub_key, 0) + amount
-        await self._save()
+        value = self._data[main_key].get(sub_key, 0) + amount
+        self._data[main_key][sub_key] = value
+        await self._commit(["nset", main_key, sub_key, value])
+
+    async def increment_fields(
+        self,
+        main_key: str,
+        sub_key: str,
+        deltas: Dict[str, int],
+        defaults: Optional[Dict[str, int]] = None
+    ) -> Dict[str, int]:
+        """
+        Create-if-missing and bump several counters of one nested record
+        as a single mutation. Returns a copy of the updated record.
+        """
+        group = self._data.setdefault(main_key, {})
+        record = group.get(sub_key)
+        if record is None:
+            record = dict(defaults or {})
+            group[sub_key] = record
+        for field, amount in deltas.items():
+            record[field] = record.get(field, 0) + amount
+        await self._commit(["nset", main_key, sub_key, record])
+        return dict(record)
+
+
+def _apply_record(data: Dict[str, Any], record: List[Any]):
+    op = record[0]
+    if op == "set":
+        data[record[1]] = record[2]
+    elif op == "del":
+        data.pop(record[1], None)
+    elif op == "nset":
+        data.setdefault(record[1], {})[record[2]] = record[3]
+    elif op == "nbatch":
+        group = data.setdefault(record[1], {})
+        group.update(record[2])
+        for sub_key in record[3]:
+            group.pop(sub_key, None)
+        if not group:
+            del data[record[1]]
+    else:
+        raise ValueError(f"Unknown log op: {op}")
+
+
+def replay_log(
+    data: Any,
+    log_path: str,
+    apply: Callable[[Any, List[Any]], None] = _apply_record
+) -> int:
+    """
+    Apply the records in `log_path` to `data`. Returns how many were applied.
+
+    A torn final line (a crash mid-append) is cut off the file, so the
+    next append starts on a clean line instead of being glued to it.
+    """
+    if not os.path.exists(log_path):
+        return 0
+
+    replayed = 0
+    good_offset = 0
+    torn = False
+    with open(log_path, "rb") as f:
+        for line in f:
+            try:
+                apply(data, json.loads(line))
+            except (ValueError, KeyError, IndexError, TypeError):
+                logger.warning(f"Dropping unreadable log record at byte {good_offset} of {log_path}")
+                torn = True
+                break
+            replayed += 1
+            good_offset += len(line)
+            if not line.endswith(b"\n"):
+                # Complete record whose newline never made it to disk
+                torn = True
+                break
+
+    if torn:
+        with open(log_path, "r+b") as f:
+            f.truncate(good_offset)
+            if good_offset and not _ends_with_newline(f, good_offset):
+                f.seek(good_offset)
+                f.write(b"\n")
+    return replayed
+
+
+def _ends_with_newline(f, size: int) -> bool:
+    f.seek(size - 1)
+    return f.read(1) == b"\n"
+
+
+def write_atomic(path: str, payload: str):
+    """Replace `path` with `payload` through a temp file and rename."""
+    temp_file = path + ".tmp"
+    with open(temp_file, "w") as f:
+        f.write(payload)
+    os.replace(temp_file, path)
+
+
+def append_log(log_path: str, text: str) -> int:
+    """Append `text` to the log; returns the log's new size."""
+    with open(log_path, "a") as f:
+        f.write(text)
+        return f.tell()
+
+
+def replace_with_snapshot(path: str, log_path: str, payload: str):
+    """Write a full snapshot to `path`, then empty the log it supersedes."""
+    write_atomic(path, payload)
+    # Only truncate once the snapshot is safely in place
+    open(log_path, "w").close()
+
+
+class AppendLogStorage(JSONStorage):
+    """
+    JSON storage backed by an append-only mutation log.
+
+    The JSON file holds the last compacted snapshot. Every mutation
+    appends one compact record to `<file>.log` instead of rewriting
+    the whole document, and the log is folded back into the snapshot
+    in the background once it passes `compact_threshold` bytes.
+
+    Records always carry absolute values (never deltas), so replaying
+    a log on top of a snapshot that already contains it is harmless.
+    """
+
+    def __init__(self, file_path: str, compact_threshold: int = LOG_COMPACT_THRESHOLD, **options):
+        self.log_path = file_path + ".log"
+        self.compact_threshold = compact_threshold
+        self._compact_task = None
+        super().__init__(file_path, **options)
+
+    # --------------------------------------------------
+    # INITIALIZATION
+    # --------------------------------------------------
+
+    def _load(self):
+        super()._load()
+        self._replay()
+
+    def _replay(self):
+        replayed = replay_log(self._data, self.log_path)
+        if replayed:
+            logger.info(f"Replayed {replayed} log records into {self.file_path}")
+
+    # --------------------------------------------------
+    # PERSISTENCE
+    # --------------------------------------------------
+
+    async def _commit(self, record: List[Any]):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+
+        async with self._lock:
+            try:
+                size = await asyncio.get_running_loop().run_in_executor(None, self._append, line)
+            except Exception as e:
+                logger.error(f"Storage log append failed: {e}")
+                return
+
+        if size >= self.compact_threshold and not self._compacting():
+            self._compact_task = asyncio.create_task(self._compact())
+
+    def _append(self, line: str) -> int:
+        return append_log(self.log_path, line)
+
+    async def flush(self):
+        # Each mutation was already written to the log (handed to the OS,
+        # not fsynced); just let a running compaction finish
+        if self._compacting():
+            await self._compact_task
+
+    def _compacting(self) -> bool:
+        return self._compact_task is not None and not self._compact_task.done()
+
+    async def _compact(self):
+        async with self._lock:
+            started = time.perf_counter()
+            try:
+                payload = json.dumps(self._data, indent=4)
+                await asyncio.get_running_loop().run_in_executor(None, self._replace_log, payload)
+            except Exception as e:
+                logger.error(f"Storage compaction failed: {e}")
+            self.save_latency.observe(time.perf_counter() - started)
+
+    def _replace_log(self, payload: str):
+        replace_with_snapshot(self.file_path, self.log_path, payload)
+
+
+class SQLiteStorage:
+    """
+    SQLite storage with the same async interface as JSONStorage.
+
+    A `{group_id: {user_id: value}}` document becomes one row per
+    (group_id, user_id) in `table`, so writes touch a single row
+    instead of the whole file. With `columns`, values are dicts of
+    integer counters kept in real columns and `increment_fields` is
+    one atomic `UPDATE ... SET x = x + ?`. Otherwise values are
+    stored as JSON text.
+
+    The database runs in WAL mode and every statement executes on a
+    dedicated thread, off the event loop.
+    """
+
+    def __init__(self, db_path: str, table: str, columns: Optional[Sequence[str]] = None):
+        self.db_path = db_path
+        self.table = table
+        self.columns = tuple(columns) if columns else None
+        self.file_path = f"{db_path}:{table}"
+        self.save_latency = metrics.LatencyHistogram()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sqlite-{table}")
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_table()
+        _open_storages.add(self)
+
+    # --------------------------------------------------
+    # INITIALIZATION
+    # --------------------------------------------------
+
+    def _create_table(self):
+        if self.columns:
+            value_columns = ", ".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in self.columns)
+        else:
+            value_columns = "value TEXT NOT NULL"
+        with self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                f"group_id TEXT NOT NULL, user_id TEXT NOT NULL, {value_columns}, "
+                f"PRIMARY KEY (group_id, user_id))"
+            )
+
+    def import_json(self, file_path: str) -> int:
+        """
+        One-shot migration of an existing JSON (or JSON + log) store.
+        Only runs while the table is empty; the source file is renamed
+        to `<file>.migrated` afterwards. Returns the imported row count.
+        """
+        if not os.path.exists(file_path):
+            return 0
+
+        with self._conn:
+            # Shards start together: hold the write lock from the emptiness
+            # check to the insert, so exactly one of them imports
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._conn.execute(f"SELECT 1 FROM {self.table} LIMIT 1").fetchone():
+                return 0
+            try:
+                with open(file_path, "r") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                # Another process finished the migration and renamed it
+                return 0
+            replay_log(data, file_path + ".log")
+
+            rows = [
+                self._to_row(group_id, user_id, value)
+                for group_id, users in data.items()
+                for user_id, value in users.items()
+            ]
+            self._conn.executemany(self._insert_sql("INSERT OR REPLACE"), rows)
+
+        os.replace(file_path, file_path + ".migrated")
+        if os.path.exists(file_path + ".log"):
+            os.replace(file_path + ".log", file_path + ".log.migrated")
+        logger.info(f"Migrated {len(rows)} rows from {file_path} into {self.file_path}")
+        return len(rows)
+
+    # --------------------------------------------------
+    # ROW MAPPING
+    # --------------------------------------------------
+
+    def _value_columns(self) -> Sequence[str]:
+        return self.columns or ("value",)
+
+    def _insert_sql(self, verb: str = "INSERT") -> str:
+        names = ", ".join(("group_id", "user_id") + tuple(self._value_columns()))
+        marks = ", ".join("?" * (len(self._value_columns()) + 2))
+        return f"{verb} INTO {self.table} ({names}) VALUES ({marks})"
+
+    def _to_row(self, group_id: str, user_id: str, value: Any) -> tuple:
+        if self.columns:
+            return (str(group_id), str(user_id)) + tuple(int(value.get(column, 0)) for column in self.columns)
+        return (str(group_id), str(user_id), json.dumps(value))
+
+    def _from_row(self, row: tuple) -> Any:
+        if self.columns:
+            return dict(zip(self.columns, row))
+        return json.loads(row[0])
+
+    def _check_fields(self, fields):
+        unknown = set(fields) - set(self.columns or ())
+        if unknown:
+            raise ValueError(f"Unknown {self.table} fields: {', '.join(sorted(unknown))}")
+
+    # --------------------------------------------------
+    # EXECUTION
+    # --------------------------------------------------
+
+    async def _run(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.save_latency.observe(time.perf_counter() - started)
+
+    def _select_group(self, group_id: str) -> Dict[str, Any]:
+        select = ", ".join(self._value_columns())
+        cursor = self._conn.execute(
+            f"SELECT user_id, {select} FROM {self.table} WHERE group_id = ?", (group_id,)
+        )
+        return {row[0]: self._from_row(row[1:]) for row in cursor}
+
+    def _select_all(self) -> Dict[str, Any]:
+        select = ", ".join(self._value_columns())
+        data: Dict[str, Any] = {}
+        for row in self._conn.execute(f"SELECT group_id, user_id, {select} FROM {self.table}"):
+            data.setdefault(row[0], {})[row[1]] = self._from_row(row[2:])
+        return data
+
+    def _select_many(self, group_id: str, user_ids: Sequence[str]) -> Dict[str, Any]:
+        select = ", ".join(self._value_columns())
+        cursor = self._conn.execute(
+            f"SELECT user_id, {select} FROM {self.table} "
+            f"WHERE group_id = ? AND user_id IN ({', '.join('?' * len(user_ids))})",
+            (group_id, *user_ids)
+        )
+        return {row[0]: self._from_row(row[1:]) for row in cursor}
+
+    def _replace_group(self, group_id: str, value: Dict[str, Any]):
+        with self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE group_id = ?", (group_id,))
+            self._conn.executemany(
+                self._insert_sql(),
+                [self._to_row(group_id, user_id, item) for user_id, item in value.items()]
+            )
+
+    def _delete_group(self, group_id: str):
+        with self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE group_id = ?", (group_id,))
+
+    def _upsert(self, group_id: str, user_id: str, value: Any):
+        with self._conn:
+            self._conn.execute(self._insert_sql("INSERT OR REPLACE"), self._to_row(group_id, user_id, value))
+
+    def _upsert_many(self, group_id: str, values: Dict[str, Any], deleted: Sequence[str]):
+        with self._conn:
+            self._conn.executemany(
+                self._insert_sql("INSERT OR REPLACE"),
+                [self._to_row(group_id, user_id, value) for user_id, value in values.items()]
+            )
+            self._conn.executemany(
+                f"DELETE FROM {self.table} WHERE group_id = ? AND user_id = ?",
+                [(group_id, user_id) for user_id in deleted]
+            )
+
+    def _increment_value(self, group_id: str, user_id: str, amount: int):
+        with self._conn:
+            self._conn.execute(
+                f"INSERT INTO {self.table} (group_id, user_id, value) VALUES (?, ?, ?) "
+                f"ON CONFLICT (group_id, user_id) DO UPDATE SET value = CAST(value AS INTEGER) + ?",
+                (group_id, user_id, json.dumps(amount), amount)
+            )
+
+    def _increment_columns(self, group_id: str, user_id: str, deltas: Dict[str, int]) -> Dict[str, int]:
+        fields = list(deltas)
+        updates = ", ".join(f"{field} = {field} + excluded.{field}" for field in fields)
+        with self._conn:
+            self._conn.execute(
+                f"INSERT INTO {self.table} (group_id, user_id, {', '.join(fields)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(fields))}) "
+                f"ON CONFLICT (group_id, user_id) DO UPDATE SET {updates}",
+                (group_id, user_id, *deltas.values())
+            )
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.columns)} FROM {self.table} WHERE group_id = ? AND user_id = ?",
+                (group_id, user_id)
+            ).fetchone()
+        return self._from_row(row)
+
+    # --------------------------------------------------
+    # GENERIC METHODS
+    # --------------------------------------------------
+
+    async def get(self, key: str, default=None):
+        value = await self._run(self._select_group, key)
+        return value if value else default
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        await self._run(self._replace_group, key, value)
+
+    async def delete(self, key: str):
+        await self._run(self._delete_group, key)
+
+    async def all(self):
+        return await self._run(self._select_all)
+
+    async def get_many(self, main_key: str, sub_keys: Sequence[str]) -> Dict[str, Any]:
+        if not sub_keys:
+            return {}
+        return await self._run(self._select_many, main_key, list(sub_keys))
+
+    async def update_nested(self, main_key: str, sub_key: str, value: Any):
+        await self._run(self._upsert, main_key, sub_key, value)
+
+    async def update_nested_many(self, main_key: str, values: Dict[str, Any], deleted: Sequence[str] = ()):
+        await self._run(self._upsert_many, main_key, values, list(deleted))
+
+    async def increment_nested(self, main_key: str, sub_key: str, amount: int = 1):
+        await self._run(self._increment_value, main_key, sub_key, amount)
+
+    async def increment_fields(
+        self,
+        main_key: str,
+        sub_key: str,
+        deltas: Dict[str, int],
+        defaults: Optional[Dict[str, int]] = None
+    ) -> Dict[str, int]:
+        # Column defaults already cover `defaults`
+        self._check_fields(deltas)
+        return await self._run(self._increment_columns, main_key, sub_key, deltas)
+
+    async def flush(self):
+        # Every statement commits on its own
+        pass
+
+    def stats(self) -> dict:
+        return {"save_latency": self.save_latency.snapshot()}
+
+
+STORAGE_BACKENDS = {
+    "json": JSONStorage,
+    "log": AppendLogStorage,
+    "sqlite": SQLiteStorage,
+}
+
+
+def create_storage(
+    file_path: str,
+    backend: str = "json",
+    columns: Optional[Sequence[str]] = None,
+    sqlite_path: str = SQLITE_PATH,
+    **options
+):
+    """
+    Open `file_path` with the configured storage backend.
+    The SQLite backend maps the file to a table named after it and
+    imports the existing JSON file the first time it is opened.
+    """
+    try:
+        storage_class = STORAGE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend: {backend}")
+
+    if storage_class is SQLiteStorage:
+        table = os.path.splitext(os.path.basename(file_path))[0]
+        storage = SQLiteStorage(sqlite_path, table, columns)
+        storage.import_json(file_path)
+        return storage
+
+    return storage_class(file_path, **options)
+
+
+async def flush_all():
+    """Flush every open store. Called on shutdown."""
+    for storage in list(_open_storages):
+        await storage.flush()
+
+
+def storage_stats() -> dict:
+    return {storage.file_path: storage.stats() for storage in list(_open_storages)}
+
+
+metrics.register("storage", storage_stats)
@@ -0,0 +1,144 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+import redis_session_store
+from fake_redis import FakeRedisServer
+from redis_session_store import RedisSessionStore
+from session_manager import MAX_GROUP_SESSIONS, MAX_USER_ACTIVE_SESSIONS
+
+GROUP_ID = -1001
+MODES = ("proposal", "crush", "prank", "breakup")
+
+
+@asynccontextmanager
+async def redis_store():
+    server = FakeRedisServer()
+    store = RedisSessionStore(await server.start())
+    try:
+        yield store
+    finally:
+        await store.save_state()
+        await server.stop()
+
+
+def test_create_get_update_end():
+    async def scenario():
+        async with redis_store() as store:
+            session = await store.create(GROUP_ID, "proposal", 1, 2)
+            assert (await store.get(GROUP_ID, session.session_id)).target_id == 2
+
+            await store.update(GROUP_ID, session.session_id, stage="accepted")
+            assert (await store.get(GROUP_ID, session.session_id)).stage == "accepted"
+            assert await store.increment_rejection(GROUP_ID, session.session_id) == 1
+
+            assert (await store.end(GROUP_ID, session.session_id)).session_id == session.session_id
+            assert await store.get(GROUP_ID, session.session_id) is None
+            assert await store.increment_rejection(GROUP_ID, session.session_id) == 0
+
+    asyncio.run(scenario())
+
+
+def test_group_limit():
+    async def scenario():
+        async with redis_store() as store:
+            for user_id in range(MAX_GROUP_SESSIONS):
+                await store.create(GROUP_ID, "proposal", user_id, 999)
+
+            with pytest.raises(ValueError, match="Too many active love stories"):
+                await store.create(GROUP_ID, "proposal", 500, 999)
+            # Other groups are unaffected
+            await store.create(GROUP_ID - 1, "proposal", 500, 999)
+
+    asyncio.run(scenario())
+
+
+def test_user_limit_frees_up_on_end():
+    async def scenario():
+        async with redis_store() as store:
+            sessions = [
+                await store.create(GROUP_ID, mode, 1, 2)
+                for mode in MODES[:MAX_USER_ACTIVE_SESSIONS]
+            ]
+            with pytest.raises(ValueError, match="too many active stories"):
+                await store.create(GROUP_ID, MODES[MAX_USER_ACTIVE_SESSIONS], 1, 2)
+
+            await store.end(GROUP_ID, sessions[0].session_id)
+            await store.create(GROUP_ID, MODES[MAX_USER_ACTIVE_SESSIONS], 1, 2)
+
+    asyncio.run(scenario())
+
+
+def test_cooldown_is_per_user_and_mode():
+    async def scenario():
+        async with redis_store() as store:
+            session = await store.create(GROUP_ID, "crush", 1, 2)
+            await store.end(GROUP_ID, session.session_id)
+
+            with pytest.raises(ValueError, match=r"Cooldown active\. Please wait \d+s before using /crush"):
+                await store.create(GROUP_ID, "crush", 1, 2)
+            await store.create(GROUP_ID, "prank", 1, 2)
+            await store.create(GROUP_ID, "crush", 3, 2)
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_creates_retry_and_keep_every_session():
+    # Each contender loses at most once per other winner, so fewer
+    # contenders than CAS_RETRIES all get through
+    contenders = redis_session_store.CAS_RETRIES - 2
+
+    async def scenario():
+        async with redis_store() as store:
+            sessions = await asyncio.gather(*(
+                store.create(GROUP_ID, "proposal", user_id, 999) for user_id in range(contenders)
+            ))
+            assert store.cas_conflicts > 0
+            assert len({session.session_id for session in sessions}) == contenders
+            for session in sessions:
+                assert await store.get(GROUP_ID, session.session_id) is not None
+
+            # None of the racing writes was lost from the group index
+            remaining = MAX_GROUP_SESSIONS - contenders
+            for user_id in range(remaining):
+                await store.create(GROUP_ID, "crush", user_id, 999)
+            with pytest.raises(ValueError, match="Too many active love stories"):
+                await store.create(GROUP_ID, "prank", 0, 999)
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_updates_retry_without_lost_increments():
+    presses = redis_session_store.CAS_RETRIES - 2
+
+    async def scenario():
+        async with redis_store() as store:
+            session = await store.create(GROUP_ID, "proposal", 1, 2)
+            await asyncio.gather(*(
+                store.increment_rejection(GROUP_ID, session.session_id) for _ in range(presses)
+            ))
+            assert (await store.get(GROUP_ID, session.session_id)).rejection_count == presses
+            assert store.cas_conflicts > 0
+
+    asyncio.run(scenario())
+
+
+def test_sessions_and_cooldowns_expire_by_ttl(monkeypatch):
+    monkeypatch.setattr(redis_session_store, "SESSION_TIMEOUT", 1)
+    monkeypatch.setattr(redis_session_store, "MODE_COOLDOWN", 1)
+
+    async def scenario():
+        async with redis_store() as store:
+            sessions = [
+                await store.create(GROUP_ID, "proposal", user_id, 999)
+                for user_id in range(MAX_GROUP_SESSIONS)
+            ]
+            await asyncio.sleep(1.2)
+
+            assert await store.get(GROUP_ID, sessions[0].session_id) is None
+            # Limits and cooldowns lapsed with the keys
+            for user_id in range(MAX_GROUP_SESSIONS):
+                await store.create(GROUP_ID, "proposal", user_id, 999)
+
+    asyncio.run(scenario())
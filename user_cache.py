@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from pyrogram import Client
+from pyrogram.types import User
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TTL = 600  # 10 minutes
+USER_CACHE_SIZE = 10000
+
+
+class UserCache:
+    """
+    Shared TTL + LRU cache in front of `app.get_users`.
+
+    Seeded with the users we already hold from incoming messages, so
+    most callback lookups never reach Telegram. Concurrent misses for
+    the same id share a single API call.
+    """
+
+    def __init__(self, app: Client, ttl: float = USER_CACHE_TTL, max_size: int = USER_CACHE_SIZE):
+        self.app = app
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, Tuple[float, User]]" = OrderedDict()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        metrics.register("user_cache", self.stats)
+
+    def seed(self, user: User):
+        if user is None:
+            return
+        self._entries[user.id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user.id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, user_id: int) -> User:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+        pending = self._pending.get(user_id)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[user_id] = future
+        try:
+            user = await self.app.get_users(user_id)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't log it as unretrieved
+            raise
+        finally:
+            self._pending.pop(user_id, None)
+
+        future.set_result(user)
+        self.seed(user)
+        return user
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
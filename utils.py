@@ -1,6 +1,4 @@
-import asyncio
 import random
-from typing import Tuple
 
 
 # --------------------------------------------------
@@ -11,19 +9,6 @@ def mention(user_id: int, name: str) -> str:
     return f"[{name}](tg://user?id={user_id})"
 
 
-# --------------------------------------------------
-# CALLBACK PARSER
-# love|mode|session_id|action
-# --------------------------------------------------
-
-def parse_callback(data: str) -> Tuple[str, str, str, str]:
-    try:
-        prefix, mode, session_id, action = data.split("|")
-        return prefix, mode, session_id, action
-    except Exception:
-        return None, None, None, None
-
-
 # --------------------------------------------------
 # DRAMATIC TEXT GENERATORS
 # --------------------------------------------------
@@ -143,48 +128,44 @@ def breakup_archived() -> str:
     return random.choice(lines)
 
 
-def welcome_text() -> str:
-    lines = [
-        "💖 **Welcome to Valentine Premium Mode**\n\nDrama on. Hearts open. Choose your destiny below.",
-        "🌹 **Welcome to the Love Arena**\n\nPropose, prank, confess, breakup — everything cinematic.",
-        "✨ **Valentine Engine Activated**\n\nAaj group me sirf premium vibes. Pick a mode below."
-    ]
-    return random.choice(lines)
+WELCOME_LINES = (
+    "💖 **Welcome to Valentine Premium Mode**\n\nDrama on. Hearts open. Choose your destiny below.",
+    "🌹 **Welcome to the Love Arena**\n\nPropose, prank, confess, breakup — everything cinematic.",
+    "✨ **Valentine Engine Activated**\n\nAaj group me sirf premium vibes. Pick a mode below."
+)
 
 
-def help_text() -> str:
-    return (
-        "📖 **Love Game Help (Premium)**\n\n"
-        "/love – Open cinematic menu\n"
-        "/propose – Real proposal (reply required)\n"
-        "/crush – Anonymous crush (reply required)\n"
-        "/prank – Fake proposal prank (reply required)\n"
-        "/breakup – End your love story\n"
-        "/loveboard – View rankings\n"
-        "/vibe – Drop a fresh Valentine vibe\n\n"
-        "Each love story runs separately.\n"
-        "Sessions expire after 5 minutes.\n"
-        "Cooldown: 20 seconds per mode."
-    )
+def welcome_text() -> str:
+    return random.choice(WELCOME_LINES)
+
+
+HELP_TEXT = (
+    "📖 **Love Game Help (Premium)**\n\n"
+    "/love – Open cinematic menu\n"
+    "/propose – Real proposal (reply required)\n"
+    "/crush – Anonymous crush (reply required)\n"
+    "/prank – Fake proposal prank (reply required)\n"
+    "/breakup – End your love story\n"
+    "/loveboard – View rankings\n"
+    "/loveboard global – Rankings across all groups\n"
+    "/vibe – Drop a fresh Valentine vibe\n\n"
+    "Each love story runs separately.\n"
+    "Sessions expire after 5 minutes.\n"
+    "Cooldown: 20 seconds per mode."
+)
+
+
+VIBES = (
+    "💘 Vibe: Aaj proposal ka perfect day hai. Risk lo, history banao.",
+    "🌙 Vibe: Late-night confession energy unlocked.",
+    "🎭 Vibe: Thoda pyaar, thoda prank — perfect combo.",
+    "💔 Vibe: Breakup bhi classy hona chahiye, drama ke saath.",
+    "✨ Vibe: Group chat ko movie scene bana do."
+)
 
 
 def random_vibe() -> str:
-    vibes = [
-        "💘 Vibe: Aaj proposal ka perfect day hai. Risk lo, history banao.",
-        "🌙 Vibe: Late-night confession energy unlocked.",
-        "🎭 Vibe: Thoda pyaar, thoda prank — perfect combo.",
-        "💔 Vibe: Breakup bhi classy hona chahiye, drama ke saath.",
-        "✨ Vibe: Group chat ko movie scene bana do."
-    ]
-    return random.choice(vibes)
-
-
-# --------------------------------------------------
-# DELAY UTILITY (CINEMATIC PAUSE)
-# --------------------------------------------------
-
-async def cinematic_delay(seconds: float):
-    await asyncio.sleep(seconds)
+    return random.choice(VIBES)
 
 
 # --------------------------------------------------
@@ -195,5 +176,13 @@ def not_yours_message() -> str:
     return "🚫 This love story isn’t yours."
 
 
+def already_processing_message() -> str:
+    return "⏳ Already processing… ek second ruko."
+
+
+def overloaded_message() -> str:
+    return "🚦 Bahut rush hai abhi. Thodi der baad try karo 🙏"
+
+
 def expired_message() -> str:
     return "⌛ This love story has faded away..."